@@ -1,37 +1,82 @@
+import asyncio
 import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import crud
-from app.database import SessionLocal
+from app import crud, metrics, passwords
+from app.cache import LRUCache
+from app.database import get_db
+from app.shards import use_shard
 
 
 def _pre_hash_for_bcrypt(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 
-def verify_password(plain_password: str, hashed_password: str):
+# bcrypt runs in a dedicated process pool so a burst of logins can neither
+# hold the GIL nor block the event loop. At most HASH_WORKERS hashes
+# run and HASH_QUEUE_SIZE wait, everything beyond that is rejected with 429.
+BCRYPT_ROUNDS = int(os.environ.get("MINIDRIVE_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("MINIDRIVE_HASH_WORKERS", "2"))
+HASH_QUEUE_SIZE = int(os.environ.get("MINIDRIVE_HASH_QUEUE_SIZE", "16"))
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
+
+
+async def _run_in_hash_pool(func, *args):
+    global _hash_pool
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent logins, try again later",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                # spawn, like the parse pool (imports.create_parse_pool)
+                _hash_pool = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return await asyncio.wrap_future(_hash_pool.submit(func, *args))
+    finally:
+        _hash_slots.release()
+
+
+async def verify_password(plain_password: str, hashed_password: str):
     pre_hashed = _pre_hash_for_bcrypt(plain_password)
-    return bcrypt.checkpw(pre_hashed.encode("utf-8"), hashed_password.encode("utf-8"))
+    return await _run_in_hash_pool(
+        passwords.check_password,
+        pre_hashed.encode("utf-8"),
+        hashed_password.encode("utf-8"),
+    )
 
 
-def get_password_hash(password: str):
+async def get_password_hash(password: str):
     pre_hashed = _pre_hash_for_bcrypt(password)
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(pre_hashed.encode("utf-8"), salt).decode("utf-8")
+    return await _run_in_hash_pool(
+        passwords.hash_password, pre_hashed.encode("utf-8"), BCRYPT_ROUNDS
+    )
 
 
-def get_db():
-    db = SessionLocal()
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a different cost than BCRYPT_ROUNDS."""
     try:
-        yield db
-    finally:
-        db.close()
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 
 # Der hier würde natürlich sonst woanders liegen. Zur einfachheit, hardcodiert.
@@ -41,6 +86,20 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified tokens -> resolved user. Entries never outlive the token's exp and
+# are dropped by invalidate_user() when the user changes.
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL_SECONDS = 60
+
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+metrics.REGISTRY.append(
+    metrics.CacheMetrics("user_cache", "Verified tokens", user_cache.stats)
+)
+
+
+def invalidate_user(username: str) -> None:
+    user_cache.delete_where(lambda user: user.username == username)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -53,10 +112,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: SessionLocal = Depends(get_db),  # type: ignore
+    db: AsyncSession = Depends(get_db),
 ):
+    cached = user_cache.get(token)
+    if cached is not None:
+        await use_shard(db, cached.id)
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -70,7 +134,18 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = crud.get_user_by_username(db, username=username)
+    user = await crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
+
+    # Detach, otherwise a commit in this request would expire the cached object
+    db.expunge(user)
+    ttl = USER_CACHE_TTL_SECONDS
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = min(ttl, exp - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        user_cache.set(token, user, ttl=ttl)
+    # The endpoint shares this session, its contact queries go to the shard
+    await use_shard(db, user.id)
     return user
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+# Files named by the SHA-256 of their content: raw uploads and contact
+# photos. Identical content is stored once and a blob never changes, so it
+# can be shared by rows, jobs and processes without coordination.
+BLOB_DIR = os.environ.get("MINIDRIVE_BLOB_DIR", "blobs")
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobWriter:
+    """A new blob, written in pieces and hashed on the way.
+
+    Use it as a context manager: the data lands in a temporary file next to
+    the blobs and only ``commit()`` moves it to its final name, leaving the
+    block without a commit throws it away."""
+
+    def __init__(self, store: "BlobStore"):
+        self._store = store
+        self._path = store._temporary_file()
+        self._file = open(self._path, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.digest: Optional[str] = None
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        self._file.close()
+        self.digest = self._hash.hexdigest()
+        self._store._place(self._path, self.digest)
+        return self.digest
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.digest is None:
+            self._file.close()
+            os.remove(self._path)
+
+
+class BlobStore:
+    """Content-addressed files below ``root``, in two levels of directories
+    (``ab/cd/abcd...``) so no directory gets too large.
+
+    Writes are atomic: a blob is written to ``root/tmp`` and renamed into
+    place, readers never see a partial file. They are not synced to disk,
+    like the database (synchronous=NORMAL) a crash may lose the last ones.
+    The store is only a path, it can be passed to worker processes."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        # Digests come from the database, never build paths from anything else
+        if not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` unless it is there already, returns the digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            with self.writer() as blob:
+                blob.write(data)
+                blob.commit()
+        return digest
+
+    def _temporary_file(self) -> str:
+        # Same file system as the blobs, os.replace() is a rename
+        directory = os.path.join(self.root, "tmp")
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory)
+        os.close(fd)
+        return path
+
+    def _place(self, temporary: str, digest: str) -> None:
+        target = self.path(digest)
+        if os.path.exists(target):
+            # Stored before, keep the existing file
+            os.remove(temporary)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Concurrent writers of the same content both rename, either wins
+        os.replace(temporary, target)
+
+
+blob_store = BlobStore()
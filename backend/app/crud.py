@@ -1,59 +1,532 @@
+import base64
+import json
+from collections import defaultdict
 from datetime import datetime, timezone
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, delete, func, insert, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, noload, selectinload
 
+from app import auth, search, sync
 from app.auth import get_password_hash
+from app.events import record_changes
+from app.normalize import contact_hashes, normalize_communication
+from app.parser.vCardParser import contact_row
 from app.pydantic_schema import schema
 from app.sql_schema import models
 
+# Rows per executemany statement during vCard imports
+VCARD_IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(
+        select(models.User).where(models.User.username == username)
+    )
+    return result.scalars().first()
 
 
-def create_user(db: Session, user: schema.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schema.UserCreate):
+    hashed_password = await get_password_hash(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    auth.invalidate_user(db_user.username)
     return db_user
 
 
-def get_contact(db: Session, contact_id: int, user_id: int):
-    return (
-        db.query(models.Contact)
-        .filter(models.Contact.id == contact_id, models.Contact.owner_id == user_id)
-        .first()
+def _contact_select(with_communications: bool = True):
+    """Communications are loaded with one batched SELECT ... IN per query
+    (instead of one lazy load per contact) or skipped entirely."""
+    if with_communications:
+        option = selectinload(models.Contact.communications)
+    else:
+        option = noload(models.Contact.communications)
+    return select(models.Contact).options(option)
+
+
+async def update_user_password_hash(
+    db: AsyncSession, user: models.User, hashed_password: str
+):
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user.id)
+        .values(hashed_password=hashed_password)
+    )
+    await db.commit()
+    auth.invalidate_user(user.username)
+
+
+async def get_contact(
+    db: AsyncSession, contact_id: int, user_id: int, reload: bool = False
+):
+    """``reload`` refreshes a contact already in the session after a write."""
+    stmt = _contact_select().where(
+        models.Contact.id == contact_id, models.Contact.owner_id == user_id
+    )
+    if reload:
+        stmt = stmt.execution_options(populate_existing=True)
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+
+async def get_contact_photo(db: AsyncSession, contact_id: int, user_id: int):
+    """(photo_sha256, photo_type) of the contact, None if there is no such
+    contact."""
+    result = await db.execute(
+        select(models.Contact.photo_sha256, models.Contact.photo_type).where(
+            models.Contact.id == contact_id, models.Contact.owner_id == user_id
+        )
     )
+    return result.first()
+
+
+# Column order of schema.ContactResponse and schema.Communication: list
+# responses are assembled from plain rows and serialized without validation
+_CONTACT_COLUMNS = (
+    "first_name",
+    "last_name",
+    "company",
+    "notes",
+    "address",
+    "id",
+    "modified",
+    "created",
+    "photo_sha256",
+)
+_COMMUNICATION_COLUMNS = ("comm_type", "label", "value", "id", "contact_id")
+
+
+def _contact_rows_select():
+    contact = models.Contact.__table__
+    return select(*(contact.c[name] for name in _CONTACT_COLUMNS))
+
+
+async def _communications_by_contact(
+    db: AsyncSession, contact_ids: List[int]
+) -> Dict[int, List[Row]]:
+    comm = models.Communication.__table__
+    comms: Dict[int, List[Row]] = {contact_id: [] for contact_id in contact_ids}
+    if contact_ids:
+        result = await db.execute(
+            select(*(comm.c[name] for name in _COMMUNICATION_COLUMNS))
+            .where(comm.c.contact_id.in_(contact_ids))
+            .order_by(comm.c.id)
+        )
+        for row in result:
+            comms[row.contact_id].append(row)
+    return comms
+
+
+async def _contact_dicts(
+    db: AsyncSession, rows: List[Row], with_communications: bool
+) -> List[dict]:
+    comms = {}
+    if with_communications:
+        comms = await _communications_by_contact(db, [row.id for row in rows])
+    return [
+        {
+            **dict(zip(_CONTACT_COLUMNS, row)),
+            "communications": [
+                dict(zip(_COMMUNICATION_COLUMNS, comm))
+                for comm in comms.get(row.id, ())
+            ],
+        }
+        for row in rows
+    ]
 
 
-def get_contacts(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return (
-        db.query(models.Contact)
-        .filter(models.Contact.owner_id == user_id)
+async def get_contacts(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    with_communications: bool = True,
+) -> List[dict]:
+    """One page of contacts as dicts shaped like schema.ContactResponse."""
+    result = await db.execute(
+        _contact_rows_select()
+        .where(models.Contact.owner_id == user_id)
+        .order_by(*models.contact_sort_key)
         .offset(skip)
         .limit(limit)
+    )
+    return await _contact_dicts(db, result.all(), with_communications)
+
+
+def encode_cursor(key: Tuple[str, str, int]) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_name, first_name, contact_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not (
+        isinstance(last_name, str)
+        and isinstance(first_name, str)
+        and isinstance(contact_id, int)
+    ):
+        raise ValueError("Invalid cursor")
+    return last_name, first_name, contact_id
+
+
+async def get_contacts_after(
+    db: AsyncSession,
+    user_id: int,
+    after: Optional[Tuple[str, str, int]] = None,
+    limit: int = 100,
+    with_communications: bool = True,
+):
+    """Keyset pagination over (last_name, first_name, id).
+
+    Returns the page (dicts like get_contacts) and the sort key of its last
+    row if there are more rows.
+    """
+    last_name, first_name, contact_id = models.contact_sort_key
+    stmt = _contact_rows_select().where(models.Contact.owner_id == user_id)
+    if after is not None:
+        # The plain >= on the first column lets SQLite seek in the index,
+        # the row value comparison does the exact cut.
+        stmt = stmt.where(
+            last_name >= after[0],
+            tuple_(last_name, first_name, contact_id) > tuple_(*after),
+        )
+    result = await db.execute(
+        stmt.order_by(last_name, first_name, contact_id).limit(limit + 1)
+    )
+    rows = result.all()
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_key = (last.last_name or "", last.first_name or "", last.id)
+    return await _contact_dicts(db, rows, with_communications), next_key
+
+
+async def iter_contact_batches(
+    db: AsyncSession, user_id: int, batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[List[Tuple[Row, List[Row]]]]:
+    """All contacts of a user in sort order, ``batch_size`` at a time, as
+    (contact row, communication rows) pairs.
+
+    Plain rows instead of ORM objects: nothing ends up in the identity map,
+    so memory does not grow with the number of contacts."""
+    last_name, first_name, contact_id = models.contact_sort_key
+    after = None
+    while True:
+        stmt = _contact_rows_select().where(models.Contact.owner_id == user_id)
+        if after is not None:
+            stmt = stmt.where(
+                last_name >= after[0],
+                tuple_(last_name, first_name, contact_id) > tuple_(*after),
+            )
+        result = await db.execute(
+            stmt.order_by(last_name, first_name, contact_id).limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return
+
+        comms = await _communications_by_contact(db, [row.id for row in rows])
+        yield [(row, comms[row.id]) for row in rows]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+        after = (last.last_name or "", last.first_name or "", last.id)
+
+
+# Versioned, and never a valid list cursor: base64url has no "."
+_SYNC_TOKEN_PREFIX = "s1."
+
+
+def encode_sync_token(seq: int) -> str:
+    raw = json.dumps({"seq": seq}, separators=(",", ":")).encode("utf-8")
+    encoded = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    return _SYNC_TOKEN_PREFIX + encoded
+
+
+def decode_sync_token(token: str) -> int:
+    if not token.startswith(_SYNC_TOKEN_PREFIX):
+        raise ValueError("Invalid sync token")
+    encoded = token[len(_SYNC_TOKEN_PREFIX) :]
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        seq = json.loads(raw)["seq"]
+    except Exception:
+        raise ValueError("Invalid sync token")
+    if type(seq) is not int or seq < 0:
+        raise ValueError("Invalid sync token")
+    return seq
+
+
+async def get_changes(db: AsyncSession, user_id: int, since: int, limit: int = 1000):
+    """Contacts created or modified and ids of contacts deleted after the
+    sequence value ``since``, at most ``limit`` in sequence order.
+
+    Returns (contacts, deleted ids, last sequence value, has more)."""
+    contacts = (
+        (
+            await db.execute(
+                _contact_select(True)
+                .where(
+                    models.Contact.owner_id == user_id,
+                    models.Contact.change_seq > since,
+                )
+                .order_by(models.Contact.change_seq)
+                .limit(limit + 1)
+            )
+        )
+        .scalars()
         .all()
     )
+    tombstones = []
+    if since:
+        # A client syncing from scratch has nothing to delete
+        tombstones = (
+            await db.execute(
+                select(
+                    models.ContactTombstone.change_seq,
+                    models.ContactTombstone.contact_id,
+                )
+                .where(
+                    models.ContactTombstone.owner_id == user_id,
+                    models.ContactTombstone.change_seq > since,
+                )
+                .order_by(models.ContactTombstone.change_seq)
+                .limit(limit + 1)
+            )
+        ).all()
+
+    changes = sorted(
+        [(c.change_seq, c) for c in contacts] + [tuple(t) for t in tombstones],
+        key=lambda change: change[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Only the newest change of an id counts. Ids are reused, a deleted id can
+    # come back as a new contact. And the two queries above are separate
+    # reads (pysqlite starts no transaction for a SELECT): a contact deleted
+    # in between is returned with its old sequence value next to its newer
+    # tombstone.
+    newest = {}
+    for seq, change in changes:
+        newest[change.id if isinstance(change, models.Contact) else change] = seq
+    changed = [
+        c for seq, c in changes if isinstance(c, models.Contact) and newest[c.id] == seq
+    ]
+    deleted = [c for seq, c in changes if isinstance(c, int) and newest[c] == seq]
+    last_seq = changes[-1][0] if changes else since
+    return changed, deleted, last_seq, has_more
+
+
+async def search_contacts(
+    db: AsyncSession, user_id: int, q: str, skip: int = 0, limit: int = 20
+):
+    """Ranked full-text search (bm25) with prefix matching. If the terms
+    match nothing they are retried together with similar indexed terms, on
+    every page."""
+    terms = search.tokenize(q)
+    if not terms:
+        return []
+
+    async def ranked_ids(match: str, limit: int, skip: int) -> List[int]:
+        result = await db.execute(
+            text(
+                "SELECT rowid FROM contacts_fts "
+                "WHERE contacts_fts MATCH :match AND owner_id = :owner_id "
+                "ORDER BY rank LIMIT :limit OFFSET :skip"
+            ),
+            {"match": match, "owner_id": user_id, "limit": limit, "skip": skip},
+        )
+        return result.scalars().all()
+
+    match = search.build_match(terms)
+    ids = await ranked_ids(match, limit, skip)
+    # An empty later page is only past the end if the first one has results
+    if not ids and (skip == 0 or not await ranked_ids(match, 1, 0)):
+        expansions = {
+            term: await search.similar_terms(db, term, user_id) for term in terms
+        }
+        if any(expansions.values()):
+            ids = await ranked_ids(search.build_match(terms, expansions), limit, skip)
+    if not ids:
+        return []
+
+    result = await db.execute(
+        _contact_select().where(
+            models.Contact.id.in_(ids), models.Contact.owner_id == user_id
+        )
+    )
+    contacts = result.scalars().all()
+    by_id = {c.id: c for c in contacts}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+async def lookup_contacts(db: AsyncSession, user_id: int, comm_type: str, value: str):
+    """Reverse lookup of a phone number or e-mail address (exact match on the
+    normalized value, served by ix_communications_lookup)."""
+    normalized = normalize_communication(comm_type, value)
+    if not normalized:
+        return []
+    contact_ids = (
+        select(models.Communication.contact_id)
+        .join(models.Contact)
+        .where(
+            models.Communication.comm_type == comm_type,
+            models.Communication.normalized_value == normalized,
+            models.Contact.owner_id == user_id,
+        )
+        .distinct()
+    )
+    result = await db.execute(
+        _contact_select()
+        .where(models.Contact.id.in_(contact_ids.scalar_subquery()))
+        .order_by(models.Contact.id)
+    )
+    return result.scalars().all()
+
+
+def backfill_normalized_values(db: Session, batch_size: int = 1000):
+    """Fill normalized_value for rows written before the column existed.
+
+    Runs once at startup on the synchronous maintenance engine."""
+    while True:
+        rows = (
+            db.query(
+                models.Communication.id,
+                models.Communication.comm_type,
+                models.Communication.value,
+            )
+            .filter(
+                models.Communication.comm_type.in_(("phone", "email")),
+                models.Communication.normalized_value.is_(None),
+            )
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        db.execute(
+            update(models.Communication),
+            [
+                {
+                    "id": row.id,
+                    "normalized_value": normalize_communication(
+                        row.comm_type, row.value
+                    ),
+                }
+                for row in rows
+            ],
+        )
+        db.commit()
+
+
+_HASHED_CONTACT_COLUMNS = (
+    models.Contact.id,
+    models.Contact.first_name,
+    models.Contact.last_name,
+    models.Contact.company,
+    models.Contact.notes,
+    models.Contact.address,
+    models.Contact.photo_sha256,
+)
+_HASHED_COMMUNICATION_COLUMNS = (
+    models.Communication.contact_id,
+    models.Communication.comm_type,
+    models.Communication.label,
+    models.Communication.value,
+    models.Communication.normalized_value,
+)
+
+
+def _hash_rows(contacts: List[Row], comms: List[Row]) -> List[dict]:
+    by_contact = defaultdict(list)
+    for comm in comms:
+        by_contact[comm.contact_id].append(
+            (comm.comm_type, comm.label, comm.value, comm.normalized_value)
+        )
+    rows = []
+    for c in contacts:
+        fingerprint, content_hash = contact_hashes(
+            c.first_name,
+            c.last_name,
+            c.company,
+            c.notes,
+            c.address,
+            c.photo_sha256,
+            by_contact[c.id],
+        )
+        rows.append(
+            {"id": c.id, "fingerprint": fingerprint, "content_hash": content_hash}
+        )
+    return rows
+
+
+def backfill_fingerprints(db: Session, batch_size: int = 1000):
+    """Fill fingerprint and content_hash for contacts written before the
+    columns existed.
+
+    Runs at startup on the synchronous maintenance engine (and once per
+    shard). Like any update it moves the contacts' change_seq."""
+    while True:
+        contacts = db.execute(
+            select(*_HASHED_CONTACT_COLUMNS)
+            .where(models.Contact.fingerprint.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not contacts:
+            break
+        comms = db.execute(
+            select(*_HASHED_COMMUNICATION_COLUMNS).where(
+                models.Communication.contact_id.in_([c.id for c in contacts])
+            )
+        ).all()
+        db.execute(update(models.Contact), _hash_rows(contacts, comms))
+        db.commit()
+
+
+async def refresh_fingerprints(db: AsyncSession, contact_ids: List[int]):
+    """Recompute the hashes of contacts changed in place. The caller commits."""
+    if not contact_ids:
+        return
+    contacts = await db.execute(
+        select(*_HASHED_CONTACT_COLUMNS).where(models.Contact.id.in_(contact_ids))
+    )
+    comms = await db.execute(
+        select(*_HASHED_COMMUNICATION_COLUMNS).where(
+            models.Communication.contact_id.in_(contact_ids)
+        )
+    )
+    rows = _hash_rows(contacts.all(), comms.all())
+    if rows:
+        await db.execute(update(models.Contact), rows)
 
 
-def create_contact(db: Session, contact: schema.ContactCreate, user_id: int):
+async def create_contact(db: AsyncSession, contact: schema.ContactCreate, user_id: int):
     now = datetime.now(timezone.utc)
+    fingerprint, content_hash = contact_row(contact)[-2:]
     db_contact = models.Contact(
         first_name=contact.first_name,
         last_name=contact.last_name,
         company=contact.company,
         notes=contact.notes,
         address=contact.address,
+        fingerprint=fingerprint,
+        content_hash=content_hash,
         created=now,
         modified=now,
         owner_id=user_id,
     )
     db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    await db.flush()
 
     if contact.communications:
         for comm in contact.communications:
@@ -62,18 +535,19 @@ def create_contact(db: Session, contact: schema.ContactCreate, user_id: int):
                 comm_type=comm.comm_type,
                 label=comm.label,
                 value=comm.value,
+                normalized_value=normalize_communication(comm.comm_type, comm.value),
             )
             db.add(db_comm)
-        db.commit()
-        db.refresh(db_contact)
+    record_changes(db, user_id, created=[db_contact.id])
+    await db.commit()
 
-    return db_contact
+    return await get_contact(db, contact_id=db_contact.id, user_id=user_id, reload=True)
 
 
-def update_contact(
-    db: Session, contact_id: int, contact: schema.ContactUpdate, user_id: int
+async def update_contact(
+    db: AsyncSession, contact_id: int, contact: schema.ContactUpdate, user_id: int
 ):
-    db_contact = get_contact(db, contact_id=contact_id, user_id=user_id)
+    db_contact = await get_contact(db, contact_id=contact_id, user_id=user_id)
     if not db_contact:
         return None
 
@@ -85,9 +559,11 @@ def update_contact(
     db_contact.modified = datetime.now(timezone.utc)
 
     if contact.communications is not None:
-        db.query(models.Communication).filter(
-            models.Communication.contact_id == contact_id
-        ).delete()
+        await db.execute(
+            delete(models.Communication).where(
+                models.Communication.contact_id == contact_id
+            )
+        )
 
         for comm in contact.communications:
             db_comm = models.Communication(
@@ -95,63 +571,480 @@ def update_contact(
                 comm_type=comm.comm_type,
                 label=comm.label,
                 value=comm.value,
+                normalized_value=normalize_communication(comm.comm_type, comm.value),
             )
             db.add(db_comm)
 
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
+    # The hashes are computed from the rows, the session does not autoflush
+    await db.flush()
+    await refresh_fingerprints(db, [contact_id])
+    record_changes(db, user_id, updated=[contact_id])
+    await db.commit()
+    return await get_contact(db, contact_id=contact_id, user_id=user_id, reload=True)
 
 
-def delete_contact(db: Session, contact_id: int, user_id: int):
-    db_contact = get_contact(db, contact_id=contact_id, user_id=user_id)
-    if db_contact:
-        db.delete(db_contact)
-        db.commit()
-    return db_contact
+async def _delete_contacts(db: AsyncSession, contact_ids: List[int]):
+    """Set-wise delete, communications included, without loading anything
+    into the session. Ownership has to be checked by the caller."""
+    await db.execute(
+        delete(models.Communication).where(
+            models.Communication.contact_id.in_(contact_ids)
+        )
+    )
+    await db.execute(delete(models.Contact).where(models.Contact.id.in_(contact_ids)))
 
 
-def create_contacts_from_vcard(
-    db: Session, contacts: List[schema.ContactCreate], user_id: int
-):
-    created_contacts = []
-    try:
-        for contact in contacts:
-            now = datetime.now(timezone.utc)
-            db_contact = models.Contact(
-                first_name=contact.first_name,
-                last_name=contact.last_name,
-                company=contact.company,
-                notes=contact.notes,
-                address=contact.address,
-                created=now,
-                modified=now,
-                owner_id=user_id,
+async def delete_contact(db: AsyncSession, contact_id: int, user_id: int):
+    result = await db.execute(
+        select(models.Contact.id).where(
+            models.Contact.id == contact_id, models.Contact.owner_id == user_id
+        )
+    )
+    if result.first() is None:
+        return None
+    await _delete_contacts(db, [contact_id])
+    record_changes(db, user_id, deleted=[contact_id])
+    await db.commit()
+    return contact_id
+
+
+_IDENTIFIER_FIELDS = ("first_name", "last_name", "company")
+
+
+def _has_identifier(values) -> bool:
+    # Mirrors check_contact_has_identifier, checked up front so one invalid
+    # item does not fail the whole batch
+    return any(values.get(k) is not None for k in _IDENTIFIER_FIELDS)
+
+
+async def apply_contact_batch(
+    db: AsyncSession, operations: List[schema.ContactBatchOperation], user_id: int
+) -> List[dict]:
+    """Apply create/update/delete operations in one transaction.
+
+    Ownership of all referenced ids is checked with a single query, deletes
+    and communication replacements are single ``IN`` statements, updates and
+    creates are executemany statements. Invalid items are reported in their
+    result and skipped, everything else is committed together. Returns one
+    result per operation, in order."""
+    results: List[Optional[dict]] = [None] * len(operations)
+
+    referenced = {op.id for op in operations if op.op != "create" and op.id}
+    existing = {}
+    if referenced:
+        rows = await db.execute(
+            select(
+                models.Contact.id,
+                models.Contact.first_name,
+                models.Contact.last_name,
+                models.Contact.company,
+            ).where(
+                models.Contact.owner_id == user_id,
+                models.Contact.id.in_(referenced),
             )
+        )
+        existing = {row.id: row._asdict() for row in rows}
 
-            if contact.communications:
-                for comm in contact.communications:
-                    db_comm = models.Communication(
-                        comm_type=comm.comm_type,
-                        label=comm.label,
-                        value=comm.value,
-                    )
-                    # Über die SQLAlchemy-Relation verknüpfen
-                    # Dieser Weg ist schöner für die Ausgabe nach dem einfügen
-                    db_contact.communications.append(db_comm)
+    creates, updates, delete_ids = [], [], []
+    seen = set()
+    for index, op in enumerate(operations):
+        result = {"op": op.op, "id": op.id}
+        results[index] = result
+        if op.op == "create":
+            if op.contact is None or not _has_identifier(op.contact.model_dump()):
+                result.update(
+                    status=422,
+                    detail="First name, last name or company is required",
+                )
+                continue
+            creates.append((index, op.contact))
+            continue
 
-            db.add(db_contact)
-            created_contacts.append(db_contact)
+        if op.id is None:
+            result.update(status=422, detail="id is required")
+        elif op.id in seen:
+            result.update(status=409, detail="Contact appears more than once")
+        elif op.id not in existing:
+            result.update(status=404, detail="Contact not found")
+        elif op.op == "delete":
+            delete_ids.append(op.id)
+            result.update(status=200)
+        elif op.contact is None:
+            result.update(status=422, detail="contact is required")
+        else:
+            values = op.contact.model_dump(
+                exclude_unset=True, exclude={"communications"}
+            )
+            if not _has_identifier({**existing[op.id], **values}):
+                result.update(
+                    status=422,
+                    detail="First name, last name or company is required",
+                )
+            else:
+                updates.append((index, op.id, values, op.contact.communications))
+        seen.add(op.id)
 
-        db.commit()
+    now = datetime.now(timezone.utc)
+    try:
+        if delete_ids:
+            await _delete_contacts(db, delete_ids)
+            record_changes(db, user_id, deleted=delete_ids)
 
-        result = []
-        for c in created_contacts:
-            db.refresh(c)
-            c_dict = schema.ContactResponse.model_validate(c).model_dump()
-            result.append(c_dict)
+        if updates:
+            # Bulk UPDATE by primary key, rows with the same columns are
+            # sent as one executemany
+            await db.execute(
+                update(models.Contact),
+                [
+                    {"id": cid, **values, "modified": now}
+                    for _, cid, values, _ in updates
+                ],
+            )
+            # Same semantics as update_contact: communications are replaced
+            replaced = [
+                (cid, comms) for _, cid, _, comms in updates if comms is not None
+            ]
+            if replaced:
+                await db.execute(
+                    delete(models.Communication).where(
+                        models.Communication.contact_id.in_(
+                            [cid for cid, _ in replaced]
+                        )
+                    )
+                )
+                comm_rows = [
+                    {
+                        "contact_id": cid,
+                        "comm_type": comm.comm_type,
+                        "label": comm.label,
+                        "value": comm.value,
+                        "normalized_value": normalize_communication(
+                            comm.comm_type, comm.value
+                        ),
+                    }
+                    for cid, comms in replaced
+                    for comm in comms
+                ]
+                if comm_rows:
+                    await db.execute(insert(models.Communication), comm_rows)
+            await refresh_fingerprints(db, [cid for _, cid, _, _ in updates])
+            record_changes(db, user_id, updated=[cid for _, cid, _, _ in updates])
 
-        return result
+        created_ids = []
+        if creates:
+            created_ids = await insert_contacts(
+                db, [contact for _, contact in creates], user_id
+            )
+        await db.commit()
     except Exception as e:
-        db.rollback()  # Rollback bei Fehler -> Keine halben Kontaktlisten einfügen
-        raise RuntimeError(f"Error creating contacts: {e}")
+        await db.rollback()
+        raise RuntimeError(f"Error applying batch: {e}")
+
+    for (index, _), contact_id in zip(creates, created_ids):
+        results[index].update(id=contact_id, status=201)
+    for index, _, _, _ in updates:
+        results[index].update(status=200)
+
+    # Current state of everything created or updated, in one query
+    changed_ids = created_ids + [cid for _, cid, _, _ in updates]
+    if changed_ids:
+        rows = await db.execute(
+            _contact_select(True)
+            .where(models.Contact.id.in_(changed_ids))
+            .execution_options(populate_existing=True)
+        )
+        contacts = {c.id: c for c in rows.scalars()}
+        for result in results:
+            if result["status"] in (200, 201) and result["op"] != "delete":
+                result["contact"] = contacts.get(result["id"])
+    return results
+
+
+async def insert_contacts(
+    db: AsyncSession,
+    contacts: List[schema.ContactCreate],
+    user_id: int,
+    batch_size: int = VCARD_IMPORT_BATCH_SIZE,
+) -> List[int]:
+    """Bulk insert contacts with executemany statements in batches of
+    ``batch_size`` and return their ids. The caller commits."""
+    rows = [contact_row(contact) for contact in contacts]
+    return await insert_contact_rows(db, rows, user_id, batch_size)
+
+
+def _communication_rows(contact_ids: List[int], rows: List[tuple]) -> List[dict]:
+    return [
+        {
+            "contact_id": contact_id,
+            "comm_type": comm_type,
+            "label": label,
+            "value": value,
+            "normalized_value": normalized_value,
+        }
+        for contact_id, row in zip(contact_ids, rows)
+        for comm_type, label, value, normalized_value in row[5]
+    ]
+
+
+async def insert_contact_rows(
+    db: AsyncSession,
+    rows: List[tuple],
+    user_id: int,
+    batch_size: int = VCARD_IMPORT_BATCH_SIZE,
+) -> List[int]:
+    """insert_contacts for contacts as vCardParser.contact_row tuples."""
+    contact_ids: List[int] = []
+    now = datetime.now(timezone.utc)
+
+    # Ids are assigned here instead of using INSERT ... RETURNING: SQLite
+    # can only return ids in parameter order one row per statement. All
+    # writes go through the single writer connection, a concurrent writer
+    # from elsewhere would fail on the primary key and roll back.
+    result = await db.execute(select(func.coalesce(func.max(models.Contact.id), 0)))
+    next_id = result.scalar_one() + 1
+    # Ids and change sequence values are both consecutive, one offset maps them
+    seq_offset = await sync.reserve_change_seqs(db, len(rows)) - next_id
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        ids = list(range(next_id, next_id + len(batch)))
+        next_id += len(batch)
+        contact_rows = [
+            {
+                "id": contact_id,
+                "change_seq": contact_id + seq_offset,
+                "first_name": row[0],
+                "last_name": row[1],
+                "company": row[2],
+                "notes": row[3],
+                "address": row[4],
+                "photo_sha256": row[6],
+                "photo_type": row[7],
+                "fingerprint": row[8],
+                "content_hash": row[9],
+                "created": now,
+                "modified": now,
+                "owner_id": user_id,
+            }
+            for contact_id, row in zip(ids, batch)
+        ]
+        comm_rows = _communication_rows(ids, batch)
+        # Communications first: the search index trigger on contacts then
+        # indexes each contact once, complete with its communications.
+        # (SQLite does not enforce the foreign key, ids are preassigned.)
+        if comm_rows:
+            await db.execute(insert(models.Communication), comm_rows)
+        await db.execute(insert(models.Contact), contact_rows)
+        contact_ids.extend(ids)
+
+    record_changes(db, user_id, created=contact_ids)
+    return contact_ids
+
+
+async def _replace_contact_rows(
+    db: AsyncSession,
+    changed: List[Tuple[int, tuple]],
+    batch_size: int = VCARD_IMPORT_BATCH_SIZE,
+):
+    """Overwrite existing contacts with (id, contact_row) pairs, the way
+    apply_contact_batch updates: executemany UPDATE by primary key, the
+    communications replaced set-wise."""
+    now = datetime.now(timezone.utc)
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start : start + batch_size]
+        ids = [contact_id for contact_id, _ in batch]
+        rows = [row for _, row in batch]
+        await db.execute(
+            update(models.Contact),
+            [
+                {
+                    "id": contact_id,
+                    "first_name": row[0],
+                    "last_name": row[1],
+                    "company": row[2],
+                    "notes": row[3],
+                    "address": row[4],
+                    "photo_sha256": row[6],
+                    "photo_type": row[7],
+                    "fingerprint": row[8],
+                    "content_hash": row[9],
+                    "modified": now,
+                }
+                for contact_id, row in batch
+            ],
+        )
+        await db.execute(
+            delete(models.Communication).where(models.Communication.contact_id.in_(ids))
+        )
+        comm_rows = _communication_rows(ids, rows)
+        if comm_rows:
+            await db.execute(insert(models.Communication), comm_rows)
+
+
+async def has_contacts(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(
+        select(models.Contact.id).where(models.Contact.owner_id == user_id).limit(1)
+    )
+    return result.first() is not None
+
+
+async def import_contact_rows(
+    db: AsyncSession,
+    rows: List[tuple],
+    user_id: int,
+    claimed: Set[int],
+    batch_size: int = VCARD_IMPORT_BATCH_SIZE,
+) -> Tuple[int, int, int]:
+    """insert_contact_rows for re-imports: contacts that already exist (same
+    fingerprint) are skipped when their content hash is equal and updated
+    in bulk when it is not; the rest is inserted.
+
+    Every existing contact stands for one card of the import, ``claimed``
+    collects the ids used so far (pass the same set for all chunks of a
+    file), so a file with two identical cards keeps two contacts. Cards
+    are matched chunk by chunk: when namesakes (same fingerprint) changed,
+    a card may update the namesake that a card in a later chunk would have
+    matched exactly, that one is then inserted. The contents end up right,
+    the ids of the namesakes may not.
+    Returns (inserted, updated, unchanged). The caller commits."""
+    candidates: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    fingerprints = list({row[8] for row in rows})
+    for start in range(0, len(fingerprints), batch_size):
+        batch = fingerprints[start : start + batch_size]
+        result = await db.execute(
+            select(
+                models.Contact.id,
+                models.Contact.fingerprint,
+                models.Contact.content_hash,
+            ).where(
+                models.Contact.owner_id == user_id,
+                models.Contact.fingerprint.in_(batch),
+            )
+        )
+        for contact_id, fingerprint, content_hash in result:
+            if contact_id not in claimed:
+                candidates[fingerprint].append((contact_id, content_hash))
+
+    # Exact matches first, a changed card must not take the contact an
+    # unchanged duplicate of it would match
+    unchanged = 0
+    remaining = []
+    for row in rows:
+        matches = candidates.get(row[8])
+        for i, (contact_id, content_hash) in enumerate(matches or ()):
+            if content_hash == row[9]:
+                del matches[i]
+                claimed.add(contact_id)
+                unchanged += 1
+                break
+        else:
+            remaining.append(row)
+
+    changed, new_rows = [], []
+    for row in remaining:
+        matches = candidates.get(row[8])
+        if matches:
+            contact_id, _ = matches.pop(0)
+            claimed.add(contact_id)
+            changed.append((contact_id, row))
+        else:
+            new_rows.append(row)
+
+    if changed:
+        await _replace_contact_rows(db, changed, batch_size)
+        record_changes(db, user_id, updated=[contact_id for contact_id, _ in changed])
+    if new_rows:
+        claimed.update(await insert_contact_rows(db, new_rows, user_id, batch_size))
+    return len(new_rows), len(changed), unchanged
+
+
+async def create_import_job(
+    db: AsyncSession,
+    user_id: int,
+    filename: str,
+    file_sha256: str,
+    total: Optional[int] = None,
+) -> models.ImportJob:
+    job = models.ImportJob(
+        owner_id=user_id,
+        filename=filename,
+        file_sha256=file_sha256,
+        state="queued",
+        total=total,
+        processed=0,
+        created=datetime.now(timezone.utc),
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def get_last_import_of_file(db: AsyncSession, user_id: int, file_sha256: str):
+    """The user's most recent finished import of the same file."""
+    result = await db.execute(
+        select(models.ImportJob)
+        .where(
+            models.ImportJob.owner_id == user_id,
+            models.ImportJob.state == "done",
+            models.ImportJob.file_sha256 == file_sha256,
+        )
+        .order_by(models.ImportJob.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def create_unchanged_import_job(
+    db: AsyncSession,
+    user_id: int,
+    filename: str,
+    previous: models.ImportJob,
+) -> models.ImportJob:
+    """A finished job for a file whose earlier import is still current."""
+    now = datetime.now(timezone.utc)
+    job = models.ImportJob(
+        owner_id=user_id,
+        filename=filename,
+        file_sha256=previous.file_sha256,
+        state="done",
+        total=previous.processed,
+        processed=previous.processed,
+        updated=0,
+        unchanged=previous.processed,
+        owner_version=previous.owner_version,
+        created=now,
+        started=now,
+        finished=now,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def get_import_job(db: AsyncSession, job_id: int, user_id: int):
+    result = await db.execute(
+        select(models.ImportJob).where(
+            models.ImportJob.id == job_id, models.ImportJob.owner_id == user_id
+        )
+    )
+    return result.scalars().first()
+
+
+async def get_import_jobs(db: AsyncSession, user_id: int, limit: int = 20):
+    result = await db.execute(
+        select(models.ImportJob)
+        .where(models.ImportJob.owner_id == user_id)
+        .order_by(models.ImportJob.id.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def count_pending_import_jobs(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(
+        select(func.count(models.ImportJob.id)).where(
+            models.ImportJob.owner_id == user_id,
+            models.ImportJob.state.in_(("queued", "running")),
+        )
+    )
+    return result.scalar_one()
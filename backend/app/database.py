@@ -1,12 +1,198 @@
-from sqlalchemy import create_engine
+import os
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.util import find_tables
+
+from app.metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./minidrive.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./minidrive.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Connection pragmas per profile. "production" runs the database in WAL mode so
+# readers no longer wait for the writer, and only fsyncs at checkpoints.
+ENGINE_PROFILES = {
+    "default": {},
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,  # KiB -> 64 MB page cache per connection
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+ENGINE_PROFILE = os.environ.get("MINIDRIVE_DB_PROFILE", "production")
+READ_POOL_SIZE = int(os.environ.get("MINIDRIVE_DB_READ_POOL_SIZE", "8"))
+
+
+def _set_pragmas(pragmas: dict, read_only: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if read_only and name == "journal_mode":
+                # Persistent per database file, set by the writer
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = 1")
+        cursor.close()
+
+    return on_connect
+
+
+def _engine_options(read_only: bool) -> dict:
+    """SQLite allows one writer at a time: the writer engine holds a single
+    connection (writers queue in the pool instead of spinning on the file lock),
+    the read engine keeps READ_POOL_SIZE query-only connections."""
+    pool_size = READ_POOL_SIZE if read_only else 1
+    return {
+        "connect_args": {"check_same_thread": False},
+        "pool_size": pool_size,
+        "max_overflow": pool_size if read_only else 0,
+        "pool_timeout": 30,
+    }
+
+
+def create_sqlite_engine(
+    url: str, profile: str = ENGINE_PROFILE, read_only=False, name="sync"
+):
+    new_engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_logging_name=name,
+        **_engine_options(read_only),
+    )
+    event.listen(
+        new_engine, "connect", _set_pragmas(ENGINE_PROFILES[profile], read_only)
+    )
+    instrument_engine(new_engine, name)
+    return new_engine
+
+
+def create_async_sqlite_engine(
+    url: str, profile: str = ENGINE_PROFILE, read_only=False, name=None
+):
+    name = name or ("reader" if read_only else "writer")
+    new_engine = create_async_engine(
+        url,
+        poolclass=TimedAsyncQueuePool,
+        pool_logging_name=name,
+        **_engine_options(read_only),
+    )
+    event.listen(
+        new_engine.sync_engine,
+        "connect",
+        _set_pragmas(ENGINE_PROFILES[profile], read_only),
+    )
+    instrument_engine(new_engine.sync_engine, name)
+    return new_engine
+
+
+# Synchronous engine for schema setup and maintenance tasks at startup
+engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Request handling runs on aiosqlite so database I/O never blocks the loop
+async_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL)
+async_read_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL, read_only=True)
+
+# Users and import jobs always live in the main database. With sharding
+# (app/shards.py) everything else lives in the user's shard.
+MAIN_TABLES = frozenset({"users", "import_jobs"})
+
+
+def _uses_main_tables(mapper, clause) -> bool:
+    if mapper is not None:
+        return inspect(mapper).local_table.name in MAIN_TABLES
+    if clause is None:
+        return False
+    return any(
+        table.name in MAIN_TABLES for table in find_tables(clause, include_crud=True)
+    )
+
+
+class RoutingSession(Session):
+    """Picks the engine per statement: the shard pinned by shards.use_shard
+    for contact data (text() statements included), the main database for
+    users and import jobs and for sessions without a shard. Sessions of
+    AsyncReadSessionLocal use the read engines."""
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        read_only = self.info.get("read_only", False)
+        shard = self.info.get("shard")
+        if shard is not None and not _uses_main_tables(mapper, clause):
+            engine = shard[1] if read_only else shard[0]
+        else:
+            engine = async_read_engine if read_only else async_engine
+        return engine.sync_engine
+
+    def close(self) -> None:
+        super().close()
+        # Gives the shard's engines back to shards.shard_router
+        self.info.pop("shard", None)
+        release = self.info.pop("release_shard", None)
+        if release is not None:
+            release()
+
+
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession,
+    info={"read_only": True},
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
+
+_READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# POST endpoints that only read (a login must not hold the writer while bcrypt
+# runs)
+_READ_PATHS = frozenset({"/token"})
+
+
+async def get_db(request: Request):
+    """Request scoped session: reading requests use the reader pool, all
+    others the single writer connection."""
+    if request.method in _READ_METHODS or request.url.path in _READ_PATHS:
+        session_factory = AsyncReadSessionLocal
+    else:
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+def add_missing_columns(bind=engine):
+    """create_all() does not alter existing tables, so columns added to the
+    models later are added here (nullable, without defaults)."""
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+
+
+def create_missing_indexes(bind=engine, tables=None):
+    """create_all() skips indexes of tables that already exist."""
+    with bind.begin() as conn:
+        for table in tables or Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
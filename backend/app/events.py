@@ -0,0 +1,180 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Change feed (GET /contacts/events): write paths record the contact ids
+# they touched on their session, after the commit the ids go to the
+# subscriptions of the owner. A subscription merges everything that arrives
+# while it waits to be sent, so a client gets at most one event per
+# interval, however many writes there were. In-process only: a client sees
+# the writes of the server process it is connected to.
+COALESCE_SECONDS = float(os.environ.get("MINIDRIVE_EVENTS_COALESCE_MS", "1000")) / 1000
+# More ids than this in one event are replaced by "reload": the client
+# refetches instead of receiving (and the server keeping) every id
+MAX_EVENT_IDS = int(os.environ.get("MINIDRIVE_EVENTS_MAX_IDS", "500"))
+# After a reload event the next one waits this long, a running import then
+# costs each client one refetch per interval instead of one per chunk
+RELOAD_INTERVAL_SECONDS = (
+    float(os.environ.get("MINIDRIVE_EVENTS_RELOAD_INTERVAL_MS", "5000")) / 1000
+)
+MAX_SUBSCRIPTIONS_PER_USER = int(os.environ.get("MINIDRIVE_EVENTS_MAX_STREAMS", "5"))
+# Comment lines on idle streams, proxies close silent connections
+HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    """Changes pending for one client, merged until they are sent."""
+
+    def __init__(self):
+        self.created: Set[int] = set()
+        self.updated: Set[int] = set()
+        self.deleted: Set[int] = set()
+        self.reload = False
+        self.modified: Optional[datetime] = None
+        self._pending = asyncio.Event()
+        self._not_before = 0.0
+
+    def add(
+        self,
+        created: Set[int],
+        updated: Set[int],
+        deleted: Set[int],
+        modified: datetime,
+    ) -> None:
+        self.modified = modified
+        self._pending.set()
+        if self.reload:
+            return
+        # Only the last state counts: created and deleted again is deleted,
+        # created and updated is created. Ids are reused, a deleted id can
+        # come back as created.
+        self.created -= deleted
+        self.updated -= deleted
+        self.deleted -= created
+        self.deleted |= deleted
+        self.created |= created
+        self.updated |= updated - self.created
+        if len(self.created) + len(self.updated) + len(self.deleted) > MAX_EVENT_IDS:
+            self.created.clear()
+            self.updated.clear()
+            self.deleted.clear()
+            self.reload = True
+
+    async def next_event(self, timeout: float) -> Optional[dict]:
+        """The merged changes, or None when nothing happened for
+        ``timeout`` seconds."""
+        try:
+            await asyncio.wait_for(self._pending.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        loop = asyncio.get_running_loop()
+        # The first change is sent at once, what follows is collected
+        delay = self._not_before - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.reload:
+            event = {"reload": True}
+            interval = RELOAD_INTERVAL_SECONDS
+        else:
+            event = {
+                "created": sorted(self.created),
+                "updated": sorted(self.updated),
+                "deleted": sorted(self.deleted),
+            }
+            interval = COALESCE_SECONDS
+        event["modified"] = self.modified.isoformat()
+        self.created, self.updated, self.deleted = set(), set(), set()
+        self.reload = False
+        self._pending.clear()
+        self._not_before = loop.time() + interval
+        return event
+
+
+class ChangeBroker:
+    """Subscriptions per user. Everything runs on the event loop."""
+
+    def __init__(self):
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+
+    def subscribe(self, user_id: int) -> Optional[Subscription]:
+        """None when the user has MAX_SUBSCRIPTIONS_PER_USER streams open."""
+        subscriptions = self._subscriptions.setdefault(user_id, set())
+        if len(subscriptions) >= MAX_SUBSCRIPTIONS_PER_USER:
+            return None
+        subscription = Subscription()
+        subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: int, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[user_id]
+
+    def publish(
+        self,
+        user_id: int,
+        created: Iterable[int] = (),
+        updated: Iterable[int] = (),
+        deleted: Iterable[int] = (),
+    ) -> None:
+        subscriptions = self._subscriptions.get(user_id)
+        if not subscriptions:
+            return
+        created, updated, deleted = set(created), set(updated), set(deleted)
+        modified = datetime.now(timezone.utc)
+        for subscription in subscriptions:
+            subscription.add(created, updated, deleted, modified)
+
+
+change_broker = ChangeBroker()
+
+# Called with the owner id after every commit that changed their contacts,
+# for in-process state derived from them (the response cache)
+_commit_hooks: List[Callable[[int], None]] = []
+
+
+def on_contact_changes(hook: Callable[[int], None]) -> Callable[[int], None]:
+    _commit_hooks.append(hook)
+    return hook
+
+
+def record_changes(
+    db,
+    user_id: int,
+    created: Iterable[int] = (),
+    updated: Iterable[int] = (),
+    deleted: Iterable[int] = (),
+) -> None:
+    """Remember changed contact ids on the session (sync or async), they are
+    published when it commits and dropped when it rolls back."""
+    changes = db.info.setdefault("contact_changes", {})
+    pending = changes.setdefault(user_id, (set(), set(), set()))
+    pending[0].update(created)
+    pending[1].update(updated)
+    pending[2].update(deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    changes = session.info.pop("contact_changes", None)
+    if changes:
+        # Within one transaction deletes come first (apply_contact_batch), an
+        # id in both sets belongs to a new contact
+        for user_id, (created, updated, deleted) in changes.items():
+            for hook in _commit_hooks:
+                hook(user_id)
+            change_broker.publish(
+                user_id, created, updated - created, deleted - created
+            )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("contact_changes", None)
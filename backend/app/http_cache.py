@@ -0,0 +1,85 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+# Conditional GETs for contact reads. The data is per user, so responses may
+# only be kept by the browser ("private") and have to be revalidated every
+# time ("no-cache"); a matching If-None-Match is answered with 304 before
+# the body is built.
+CACHE_CONTROL = "private, no-cache"
+# Content-addressed responses (blobs) behind a URL naming their digest
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def list_etag(user_id: int, version: int, *params) -> str:
+    """Strong ETag for a list response: the owner's change version plus
+    everything that selects or shapes the page."""
+    digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+    return f'"l{user_id}-{version}-{digest}"'
+
+
+def contact_etag(contact) -> str:
+    return f'"c{contact.id}-{contact.change_seq}"'
+
+
+def _http_date(value: datetime) -> str:
+    # Stored timestamps are naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_headers(
+    etag: str, last_modified: Optional[datetime] = None
+) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def blob_headers(digest: str, immutable: bool = False) -> Dict[str, str]:
+    return {
+        "ETag": f'"{digest}"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else CACHE_CONTROL,
+        # User supplied content, never let the browser guess another type
+        "X-Content-Type-Options": "nosniff",
+    }
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison (RFC 9110 13.1.2)
+    if header.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in header.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole seconds
+    return last_modified.replace(microsecond=0) <= since
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
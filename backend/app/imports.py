@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+
+from app import crud
+from app.blobs import blob_store
+from app.database import AsyncSessionLocal
+from app.parser.vCardParser import (
+    iter_lines,
+    iter_vcard_chunks,
+    parse_vcard_chunk,
+)
+from app.shards import use_shard
+from app.sql_schema import models
+from app.sync import get_owner_version
+
+logger = logging.getLogger(__name__)
+
+IMPORT_WORKERS = int(os.environ.get("MINIDRIVE_IMPORT_WORKERS", "2"))
+# Contacts committed per step; progress and restart granularity
+IMPORT_CHUNK_SIZE = int(os.environ.get("MINIDRIVE_IMPORT_CHUNK_SIZE", "5000"))
+# Processes parsing large files in parallel, 0 parses in the server process
+PARSE_WORKERS = int(os.environ.get("MINIDRIVE_PARSE_WORKERS", "0"))
+# Smaller files are parsed in-process: shipping the chunks to the pool and
+# the results back costs more than it saves
+PARALLEL_PARSE_MIN_CONTACTS = int(
+    os.environ.get("MINIDRIVE_PARALLEL_PARSE_MIN_CONTACTS", "20000")
+)
+# Per user: jobs imported at the same time / jobs waiting or running
+MAX_RUNNING_JOBS_PER_USER = 1
+MAX_PENDING_JOBS_PER_USER = int(os.environ.get("MINIDRIVE_MAX_PENDING_IMPORTS", "5"))
+# Uploads above these limits are rejected with 413
+MAX_UPLOAD_BYTES = int(os.environ.get("MINIDRIVE_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+MAX_UPLOAD_CONTACTS = int(os.environ.get("MINIDRIVE_MAX_UPLOAD_CONTACTS", "1000000"))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_next(chunks: Iterator[bytes]) -> Optional[List[tuple]]:
+    raw = next(chunks, None)
+    if raw is None:
+        return None
+    return parse_vcard_chunk(raw, blob_store)
+
+
+def create_parse_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: forking a process with a running event loop, threads and open
+    # database connections is not safe
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+async def iter_parsed_chunks(
+    path: str,
+    skip: int = 0,
+    pool: Optional[ProcessPoolExecutor] = None,
+    workers: int = 0,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> AsyncIterator[List[tuple]]:
+    """The contacts of a VCF file as contact_row tuples, ``chunk_size`` at a
+    time and in file order, skipping the first ``skip``.
+
+    Without a pool every chunk is parsed in a thread when it is asked for.
+    With a pool of ``workers`` processes up to twice as many chunks are
+    parsed ahead, while the caller inserts the previous ones. Photos go to
+    the blob store as they are parsed."""
+    with open(path, "rb") as f:
+        chunks = iter_vcard_chunks(iter_lines(f), chunk_size, skip=skip)
+        if pool is None:
+            while True:
+                # CPU bound, keep it off the event loop
+                rows = await run_in_threadpool(_parse_next, chunks)
+                if rows is None:
+                    return
+                yield rows
+
+        loop = asyncio.get_running_loop()
+        pending: deque = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < 2 * workers:
+                    raw = await run_in_threadpool(next, chunks, None)
+                    if raw is None:
+                        exhausted = True
+                    else:
+                        pending.append(
+                            loop.run_in_executor(
+                                pool, parse_vcard_chunk, raw, blob_store
+                            )
+                        )
+                if not pending:
+                    return
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class ImportRunner:
+    """Runs queued import jobs on the event loop.
+
+    Jobs live in the ``import_jobs`` table, so the queue survives restarts:
+    on start, jobs that were running are queued again and continue after the
+    last committed chunk. A user never has more than
+    ``MAX_RUNNING_JOBS_PER_USER`` jobs running, so one large upload cannot
+    occupy every worker.
+    """
+
+    def __init__(self, workers: int = IMPORT_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.ImportJob)
+                .where(models.ImportJob.state == "running")
+                .values(state="queued")
+            )
+            await db.commit()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._wake.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False, cancel_futures=True)
+            self._parse_pool = None
+
+    def notify(self) -> None:
+        """Wake the workers after a job was queued."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _worker(self) -> None:
+        while True:
+            # Clear before claiming, a job queued in between sets it again
+            self._wake.clear()
+            job = await self._claim()
+            if job is None:
+                await self._wake.wait()
+                continue
+            await self._run(job)
+            # The user's next job may be runnable now
+            self._wake.set()
+
+    async def _claim(self) -> Optional[models.ImportJob]:
+        busy_owners = (
+            select(models.ImportJob.owner_id)
+            .where(models.ImportJob.state == "running")
+            .group_by(models.ImportJob.owner_id)
+            .having(func.count() >= MAX_RUNNING_JOBS_PER_USER)
+        )
+        async with self._claim_lock, AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.ImportJob)
+                .where(
+                    models.ImportJob.state == "queued",
+                    models.ImportJob.owner_id.not_in(busy_owners),
+                )
+                .order_by(models.ImportJob.id)
+                .limit(1)
+            )
+            job = result.scalars().first()
+            if job is None:
+                return None
+            job.state = "running"
+            if job.started is None:
+                job.started = _now()
+            await db.commit()
+            return job
+
+    def _pool_for(self, job: models.ImportJob) -> Optional[ProcessPoolExecutor]:
+        if PARSE_WORKERS < 1 or (job.total or 0) < PARALLEL_PARSE_MIN_CONTACTS:
+            return None
+        # Started on first use and shared by the workers, the processes
+        # stay around for the next large file
+        if self._parse_pool is None:
+            self._parse_pool = create_parse_pool(PARSE_WORKERS)
+        return self._parse_pool
+
+    async def _run(self, job: models.ImportJob) -> None:
+        # The file is read and parsed one chunk at a time (in a process pool
+        # for large files), so memory does not depend on its size. Every
+        # chunk is committed together with the progress counter, a restarted
+        # job skips the committed cards.
+        # Contacts that exist already (a re-uploaded export) are matched by
+        # their fingerprints and skipped or updated instead of inserted
+        # again (crud.import_contact_rows). The owner's version is stored
+        # with every chunk: if it is still the same when the file is
+        # uploaded again, the upload finishes right away.
+        # Parsing happens outside of a session: there is only one writer
+        # connection and the other writers should not wait for the parser.
+        # A chunk that does not parse fails the job, the chunks before it
+        # stay imported (``processed``). With sharding the contacts and the
+        # job are in different files: the shard commits first, a crash in
+        # between imports that chunk again on resume instead of losing it.
+        processed = job.processed
+        updated = job.updated or 0
+        unchanged = job.unchanged or 0
+        # Contacts matched by this run; after a restart the committed chunks
+        # are not matched again, see import_contact_rows
+        claimed = set()
+        async with AsyncSessionLocal() as db:
+            await use_shard(db, job.owner_id)
+            # Nothing to match on a first import, skip the lookups
+            match = await crud.has_contacts(db, job.owner_id)
+        parsed = iter_parsed_chunks(
+            blob_store.path(job.file_sha256),
+            processed,
+            self._pool_for(job),
+            PARSE_WORKERS,
+        )
+        try:
+            async with aclosing(parsed):
+                while True:
+                    try:
+                        rows = await anext(parsed, None)
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            # A worker died, start a fresh pool next time
+                            self._parse_pool = None
+                        await self._finish(job, "failed", str(e) or type(e).__name__)
+                        return
+                    if rows is None:
+                        break
+                    async with AsyncSessionLocal() as db:
+                        await use_shard(db, job.owner_id)
+                        if match:
+                            counts = await crud.import_contact_rows(
+                                db, rows, job.owner_id, claimed
+                            )
+                            updated += counts[1]
+                            unchanged += counts[2]
+                        else:
+                            await crud.insert_contact_rows(db, rows, job.owner_id)
+                        processed += len(rows)
+                        # Read in the chunk's transaction, no other write
+                        # can come in between
+                        version = await get_owner_version(db, job.owner_id)
+                        await db.execute(
+                            update(models.ImportJob)
+                            .where(models.ImportJob.id == job.id)
+                            .values(
+                                processed=processed,
+                                updated=updated,
+                                unchanged=unchanged,
+                                owner_version=version,
+                            )
+                        )
+                        await db.commit()
+        except asyncio.CancelledError:
+            # Shutdown: the job stays "running" and is resumed on start
+            raise
+        except Exception as e:
+            logger.exception("Import job %s failed", job.id)
+            await self._finish(job, "failed", str(e) or type(e).__name__)
+            return
+        if not processed:
+            await self._finish(job, "failed", "File is not a valid VCF")
+            return
+        await self._finish(job, "done", total=processed)
+
+    async def _finish(
+        self,
+        job: models.ImportJob,
+        state: str,
+        error: Optional[str] = None,
+        total: Optional[int] = None,
+    ) -> None:
+        values = {"state": state, "error": error, "finished": _now()}
+        if total is not None:
+            values["total"] = total
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.ImportJob)
+                .where(models.ImportJob.id == job.id)
+                .values(**values)
+            )
+            await db.commit()
+
+
+import_runner = ImportRunner()
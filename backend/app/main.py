@@ -1,27 +1,97 @@
+import os
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from typing import List
+from typing import Iterator, List, Optional, Tuple, Union
 
-import vobject
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile, status
+import orjson
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    HTTPException,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import crud
+from app import crud, http_cache, metrics
 from app.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
     get_current_user,
+    get_password_hash,
+    password_needs_rehash,
     verify_password,
 )
-from app.database import SessionLocal, engine
-from app.parser.vCardParser import parse_vcards
+from app.blobs import blob_store
+from app.database import (
+    AsyncReadSessionLocal,
+    AsyncSessionLocal,
+    SessionLocal,
+    add_missing_columns,
+    async_engine,
+    async_read_engine,
+    create_missing_indexes,
+    engine,
+    get_db,
+)
+from app.events import HEARTBEAT_SECONDS, change_broker
+from app.imports import (
+    MAX_PENDING_JOBS_PER_USER,
+    MAX_UPLOAD_BYTES,
+    MAX_UPLOAD_CONTACTS,
+    import_runner,
+)
+from app.parser.vCardParser import VCardParseError, iter_lines, vcard_boundary
+from app.parser.vCardWriter import format_vcards
 from app.pydantic_schema import schema
+from app.response_cache import CachedResponse, response_cache
+from app.responses import FastJSONResponse
+from app.search import create_search_index
+from app.shards import shard_router, use_shard
 from app.sql_schema import models
+from app.sync import (
+    create_change_tracking,
+    get_owner_version,
+    get_sequence_state,
+    prune_tombstones,
+)
+
+# Responses smaller than this are sent uncompressed
+GZIP_MINIMUM_SIZE = int(os.environ.get("MINIDRIVE_GZIP_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("MINIDRIVE_GZIP_LEVEL", "5"))
 
 models.Base.metadata.create_all(bind=engine)
+add_missing_columns(bind=engine)
+create_missing_indexes(bind=engine)
+create_search_index(bind=engine)
+create_change_tracking(bind=engine)
+prune_tombstones(bind=engine)
+with SessionLocal() as _db:
+    crud.backfill_normalized_values(_db)
+    crud.backfill_fingerprints(_db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Import workers, resumes jobs interrupted by the last shutdown
+    await import_runner.start()
+    yield
+    await import_runner.stop()
+    await shard_router.dispose()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
 
-app = FastAPI(title="Minidrive Contacts API")
+app = FastAPI(title="Minidrive Contacts API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,38 +102,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
+app.add_middleware(
+    GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_LEVEL
+)
+# Added last -> outermost, so CORS preflights are measured as well
+app.add_middleware(metrics.MetricsMiddleware)
 
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    """Prometheus scrape endpoint. Not authenticated, keep it internal."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.post("/register", response_model=schema.UserResponse)
-def register_user(user: schema.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def register_user(user: schema.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    # create_user hashes the password first: release the writer connection,
+    # other writes would wait for bcrypt
+    await db.commit()
+    try:
+        return await crud.create_user(db=db, user=user)
+    except IntegrityError:
+        # Registered by a concurrent request in the meantime
+        raise HTTPException(status_code=400, detail="Username already registered")
 
 
 @app.post("/token", response_model=dict)
-def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await crud.get_user_by_username(db, username=form_data.username)
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Cost factor changed since the hash was made -> upgrade it transparently.
+    # If the hash pool is full the upgrade simply happens on a later login.
+    if password_needs_rehash(user.hashed_password):
+        try:
+            new_hash = await get_password_hash(form_data.password)
+        except HTTPException:
+            new_hash = None
+        if new_hash:
+            # db is a read-only session here, see database.get_db
+            async with AsyncSessionLocal() as write_db:
+                await crud.update_user_password_hash(write_db, user, new_hash)
+
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -72,45 +166,320 @@ def login_for_access_token(
 
 
 @app.post("/contacts/", response_model=schema.ContactResponse)
-def create_contact(
+async def create_contact(
     contact: schema.ContactCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.create_contact(db=db, contact=contact, user_id=current_user.id)
+    return await crud.create_contact(db=db, contact=contact, user_id=current_user.id)
 
 
-@app.get("/contacts/", response_model=List[schema.ContactResponse])
-def read_contacts(
+@app.post("/contacts/batch", response_model=schema.ContactBatchResponse)
+async def batch_contacts(
+    batch: schema.ContactBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Create, update and delete many contacts in one transaction. Each
+    operation gets its own result with an HTTP-like status."""
+    try:
+        results = await crud.apply_contact_batch(
+            db, batch.operations, user_id=current_user.id
+        )
+    except RuntimeError:
+        raise HTTPException(status_code=400, detail="Error applying batch")
+    return {"results": results}
+
+
+@app.get(
+    "/contacts/",
+    response_model=Union[List[schema.ContactResponse], schema.ContactPage],
+)
+async def read_contacts(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    include: str = "communications",
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    contacts = crud.get_contacts(db, skip=skip, limit=limit, user_id=current_user.id)
-    return contacts
+    """Without ``cursor`` a plain list (skip/limit) is returned. Passing
+    ``cursor`` (empty for the first page) switches to keyset pagination and
+    returns a page with ``next_cursor``.
+
+    ``include`` is a comma separated list of relations to load. Without
+    ``communications`` (e.g. ``include=``) the communication lists are left
+    empty and not queried at all.
+
+    Responses carry an ETag from the user's change version, a matching
+    If-None-Match is answered with 304 without loading any contacts.
+    Bodies are served from the response cache until the next change."""
+    with_communications = "communications" in include.split(",")
+    cache_version = response_cache.version(current_user.id)
+    cache_key = ("list", skip, limit, cursor, with_communications)
+    cached = response_cache.get(current_user.id, cache_version, cache_key)
+    if cached is not None:
+        if http_cache.is_not_modified(request, cached.headers["ETag"]):
+            return http_cache.not_modified_response(cached.headers)
+        return cached.response()
+    # The user lookup of a login may have started the read transaction
+    # before the cache version was read, it could miss the latest write
+    cacheable = not db.in_transaction()
+
+    version = await get_owner_version(db, current_user.id)
+    etag = http_cache.list_etag(
+        current_user.id, version, skip, limit, cursor, with_communications
+    )
+    headers = http_cache.cache_headers(etag)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(headers)
+
+    if cursor is None:
+        contacts = await crud.get_contacts(
+            db,
+            skip=skip,
+            limit=limit,
+            user_id=current_user.id,
+            with_communications=with_communications,
+        )
+        response = FastJSONResponse(contacts, headers=headers)
+    else:
+        try:
+            after = crud.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        contacts, next_key = await crud.get_contacts_after(
+            db,
+            user_id=current_user.id,
+            after=after,
+            limit=limit,
+            with_communications=with_communications,
+        )
+        response = FastJSONResponse(
+            {
+                "items": contacts,
+                "next_cursor": crud.encode_cursor(next_key) if next_key else None,
+            },
+            headers=headers,
+        )
+    if cacheable:
+        response_cache.set(
+            current_user.id,
+            cache_version,
+            cache_key,
+            CachedResponse(headers, response.body),
+        )
+    return response
+
+
+@app.get("/contacts/changes", response_model=schema.ContactChanges)
+async def read_contact_changes(
+    since: Optional[str] = None,
+    limit: int = 1000,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Delta sync. Without ``since`` all contacts are returned (in pages of
+    ``limit``); afterwards pass the returned ``next_token`` to get only what
+    was created, modified or deleted since. Follow ``has_more`` until it is
+    false, then keep the last token for the next sync."""
+    try:
+        seq = crud.decode_sync_token(since) if since else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+    current, pruned = await get_sequence_state(db)
+    if 0 < seq < pruned:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Sync token expired, a full sync is required",
+        )
+
+    changed, deleted, last_seq, has_more = await crud.get_changes(
+        db, user_id=current_user.id, since=seq, limit=limit
+    )
+    # Caught up: jump to the current value, the changes in between belong
+    # to other users. It was read before the changes: everything up to it
+    # was committed and is seen by get_changes, later writes get higher
+    # values and come with the next sync.
+    next_seq = last_seq if has_more else max(last_seq, current)
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "next_token": crud.encode_sync_token(next_seq),
+        "has_more": has_more,
+    }
+
+
+@app.get("/contacts/search", response_model=List[schema.ContactResponse])
+async def search_contacts(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud.search_contacts(
+        db, user_id=current_user.id, q=q, skip=skip, limit=limit
+    )
+
+
+@app.get("/contacts/lookup", response_model=List[schema.ContactResponse])
+async def lookup_contacts(
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if (phone is None) == (email is None):
+        raise HTTPException(
+            status_code=400, detail="Exactly one of phone or email is required"
+        )
+    if phone is not None:
+        return await crud.lookup_contacts(db, current_user.id, "phone", phone)
+    return await crud.lookup_contacts(db, current_user.id, "email", email)
+
+
+@app.get("/contacts/export.vcf", response_class=StreamingResponse)
+async def export_contacts(current_user: models.User = Depends(get_current_user)):
+    """All contacts as vCard 3.0, streamed batch by batch."""
+
+    async def vcards():
+        # Own session: it has to stay open until the last batch is sent.
+        # pysqlite starts no transaction for reads, every batch would see the
+        # writes committed since the one before. The explicit read
+        # transaction gives the whole export one snapshot (the WAL cannot be
+        # checkpointed past it while the export runs).
+        async with AsyncReadSessionLocal() as db:
+            await use_shard(db, current_user.id)
+            await db.execute(text("BEGIN"))
+            async for batch in crud.iter_contact_batches(db, current_user.id):
+                yield format_vcards(batch)
+
+    return StreamingResponse(
+        vcards(),
+        media_type="text/vcard; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="contacts.vcf"'},
+    )
+
+
+@app.get("/contacts/events", response_class=StreamingResponse)
+async def contact_events(
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Server-sent events for the contacts of the current user. Each
+    ``contacts`` event lists the ids created, updated and deleted since the
+    previous one (``{"created": [...], "updated": [...], "deleted": [...],
+    "modified": ...}``); after larger changes such as imports it is
+    ``{"reload": true, "modified": ...}`` and the list should be fetched
+    again. Events are merged, there is at most one per second."""
+    subscription = change_broker.subscribe(current_user.id)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open event streams",
+        )
+    # The stream stays open for hours, give the connection back now
+    await db.close()
+    user_id = current_user.id
+
+    async def events():
+        try:
+            # Reconnect delay for EventSource clients
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscription.next_event(HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    data = orjson.dumps(event).decode()
+                    yield f"event: contacts\ndata: {data}\n\n"
+        finally:
+            change_broker.unsubscribe(user_id, subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx passes each event on at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/contacts/{contact_id}", response_model=schema.ContactResponse)
-def read_contact_by_id(
+async def read_contact_by_id(
     contact_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    db_contact = crud.get_contact(db, contact_id=contact_id, user_id=current_user.id)
-    if db_contact is None:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    return db_contact
+    cache_version = response_cache.version(current_user.id)
+    cache_key = ("contact", contact_id)
+    cached = response_cache.get(current_user.id, cache_version, cache_key)
+    if cached is None:
+        # See read_contacts
+        cacheable = not db.in_transaction()
+        db_contact = await crud.get_contact(
+            db, contact_id=contact_id, user_id=current_user.id
+        )
+        if db_contact is None:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        etag = http_cache.contact_etag(db_contact)
+        cached = CachedResponse(
+            http_cache.cache_headers(etag, db_contact.modified),
+            schema.ContactResponse.model_validate(db_contact)
+            .model_dump_json()
+            .encode(),
+            db_contact.modified,
+        )
+        if cacheable:
+            response_cache.set(current_user.id, cache_version, cache_key, cached)
+
+    if http_cache.is_not_modified(
+        request, cached.headers["ETag"], cached.last_modified
+    ):
+        return http_cache.not_modified_response(cached.headers)
+    return cached.response()
+
+
+@app.get("/contacts/{contact_id}/photo", response_class=FileResponse)
+async def read_contact_photo(
+    contact_id: int,
+    request: Request,
+    v: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """The contact's photo, straight from the blob store (range requests
+    included). Pass the contact's photo_sha256 as ``v`` to get a response
+    that can be cached forever; a blob never changes, a new photo has a new
+    digest and therefore a new URL."""
+    photo = await crud.get_contact_photo(
+        db, contact_id=contact_id, user_id=current_user.id
+    )
+    if photo is None or photo.photo_sha256 is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    headers = http_cache.blob_headers(
+        photo.photo_sha256, immutable=v == photo.photo_sha256
+    )
+    if http_cache.is_not_modified(request, headers["ETag"]):
+        return http_cache.not_modified_response(headers)
+    return FileResponse(
+        blob_store.path(photo.photo_sha256),
+        media_type=photo.photo_type,
+        headers=headers,
+    )
 
 
 @app.put("/contacts/{contact_id}", response_model=schema.ContactResponse)
-def update_contact_by_id(
+async def update_contact_by_id(
     contact_id: int,
     contact: schema.ContactUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    db_contact = crud.update_contact(
+    db_contact = await crud.update_contact(
         db, contact_id=contact_id, contact=contact, user_id=current_user.id
     )
     if db_contact is None:
@@ -119,53 +488,152 @@ def update_contact_by_id(
 
 
 @app.delete("/contacts/{contact_id}")
-def delete_contact_by_id(
+async def delete_contact_by_id(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    db_contact = crud.delete_contact(db, contact_id=contact_id, user_id=current_user.id)
+    db_contact = await crud.delete_contact(
+        db, contact_id=contact_id, user_id=current_user.id
+    )
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     return {"detail": "Contact deleted successfully"}
 
 
+# Checked by _looks_like_vcf
+_VCF_HEAD_BYTES = 4096
+
+
+def _upload_lines(file: UploadFile) -> Iterator[bytes]:
+    try:
+        yield from iter_lines(file.file)
+    except VCardParseError as e:
+        # No line breaks at all, or only CRs
+        raise HTTPException(status_code=400, detail=f"File is not a valid VCF: {e}")
+
+
+def _save_upload(file: UploadFile) -> Tuple[str, int]:
+    """Archive the spooled upload in the blob store line by line, counting
+    the vCards on the way.
+
+    Returns the digest and the number of cards; raises 413 as soon as a
+    limit is exceeded and 400 for obvious garbage, nothing is stored then."""
+    size = 0
+    depth = 0
+    cards = 0
+    head = b""
+    with blob_store.writer() as blob:
+        for line in _upload_lines(file):
+            size += len(line)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f"File is larger than {MAX_UPLOAD_BYTES} bytes",
+                )
+            if len(head) < _VCF_HEAD_BYTES:
+                head += line[: _VCF_HEAD_BYTES - len(head)]
+            boundary = vcard_boundary(line)
+            if boundary:
+                depth += boundary
+                if boundary < 0 and depth == 0:
+                    cards += 1
+                    if cards > MAX_UPLOAD_CONTACTS:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                            detail=f"File has more than {MAX_UPLOAD_CONTACTS} contacts",
+                        )
+            blob.write(line)
+        if not _looks_like_vcf(head):
+            raise HTTPException(status_code=400, detail="File is not a valid VCF")
+        return blob.commit(), cards
+
+
+def _looks_like_vcf(head: bytes) -> bool:
+    # Full parsing happens in the import job, only reject obvious garbage here
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multibyte character may be cut off at the end of the block
+        if e.start < len(head) - 3:
+            return False
+    return b"BEGIN:VCARD" in head.upper()
+
+
+async def _check_pending_imports(db: AsyncSession, user_id: int) -> None:
+    pending = await crud.count_pending_import_jobs(db, user_id)
+    if pending >= MAX_PENDING_JOBS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many imports in progress",
+        )
+
+
 # https://fastapi.tiangolo.com/tutorial/request-files/#define-file-parameters
-@app.post("/files/")
+@app.post(
+    "/files/",
+    response_model=schema.ImportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def upload_file(
     file: UploadFile = File(...),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    """Queue the file for import. Progress is reported by GET /imports/{id}.
+
+    The file is never held in memory: the multipart parser spools it, it is
+    copied to the blob store line by line (and kept there) and the import
+    job parses it in chunks. nginx rejects bodies above its client_max_body_size before
+    they reach the backend, keep it in line with MINIDRIVE_MAX_UPLOAD_MB."""
     if file.content_type != "text/vcard":
         raise HTTPException(status_code=400, detail="File must be VCF")
 
-    try:
-        content = await file.read()
-        vcard = vobject.readOne(content.decode("utf-8"))
-        vcard.validate()
-    except Exception:
-        raise HTTPException(status_code=400, detail="File is not a valid VCF")
-
-    contacts = parse_vcards(content.decode("utf-8"))
+    # Checked before the copy as well, a user at the limit is turned away
+    # without storing the file
+    await _check_pending_imports(db, current_user.id)
+    # The writer connection is the only one, give it back for the copy
+    # (seconds for large files), other users' writes would wait for it
+    await db.commit()
+    file_sha256, cards = await run_in_threadpool(_save_upload, file)
+    await _check_pending_imports(db, current_user.id)
 
-    try:
-        created_contacts = crud.create_contacts_from_vcard(
-            db, contacts, current_user.id
+    # Imported before and no contact changed since: nothing to do
+    previous = await crud.get_last_import_of_file(db, current_user.id, file_sha256)
+    if previous is not None and previous.owner_version == await get_owner_version(
+        db, current_user.id
+    ):
+        return await crud.create_unchanged_import_job(
+            db, current_user.id, file.filename, previous
         )
-    except Exception:
-        raise HTTPException(status_code=400, detail="Error creating contacts")
 
-    #    upload_dir = "tmp/uploads/" + current_user.username
-    #    os.makedirs(upload_dir, exist_ok=True)
+    job = await crud.create_import_job(
+        db,
+        current_user.id,
+        filename=file.filename,
+        file_sha256=file_sha256,
+        total=cards,
+    )
+    import_runner.notify()
+    return job
 
-    #    file_path = os.path.join(upload_dir, file.filename)
-    #    with open(file_path, "wb") as buffer:
-    #        buffer.write(content)
 
-    return {
-        "filename": file.filename,
-        "status": "success",
-        "contacts_imported": len(created_contacts),
-        "contacts": created_contacts,
-    }
+@app.get("/imports/", response_model=List[schema.ImportJobResponse])
+async def read_import_jobs(
+    limit: int = 20,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud.get_import_jobs(db, current_user.id, limit=limit)
+
+
+@app.get("/imports/{job_id}", response_model=schema.ImportJobResponse)
+async def read_import_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    job = await crud.get_import_job(db, job_id=job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
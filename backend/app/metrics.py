@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# In-process metrics in the Prometheus text format, without a client library:
+# request counts and latencies per route, SQL query counts and time per
+# request, connection pool wait and a log of slow statements.
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.environ.get("MINIDRIVE_SLOW_QUERY_MS", "100")) / 1000
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = _format_labels(labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines)
+
+
+class CacheMetrics:
+    """Hit, miss and eviction counters and the size of an LRUCache, read
+    from its stats() on every scrape. With ``weight_unit`` the total weight
+    is exported as well (e.g. ``bytes``)."""
+
+    def __init__(self, name: str, help: str, stats, weight_unit: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.stats = stats
+        self.weight_unit = weight_unit
+
+    def render(self) -> str:
+        stats = self.stats()
+        values = [
+            ("hits_total", "counter", "lookups answered from the cache", "hits"),
+            ("misses_total", "counter", "lookups not in the cache", "misses"),
+            ("evictions_total", "counter", "entries pushed out", "evictions"),
+            ("entries", "gauge", "entries in the cache", "size"),
+        ]
+        if self.weight_unit:
+            values.append((self.weight_unit, "gauge", "total size", "weight"))
+        lines = []
+        for suffix, kind, description, key in values:
+            name = f"{self.name}_{suffix}"
+            lines.append(f"# HELP {name} {self.help}: {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {stats[key]}")
+        return "\n".join(lines)
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status")
+http_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request, by route",
+    QUERY_COUNT_BUCKETS,
+)
+request_query_time = Histogram(
+    "http_request_db_query_seconds",
+    "Time spent in SQL statements per request, by route",
+    LATENCY_BUCKETS,
+)
+db_queries = Counter("db_queries_total", "SQL statements by engine")
+db_query_time = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by engine", LATENCY_BUCKETS
+)
+db_slow_queries = Counter(
+    "db_slow_queries_total", "SQL statements slower than the slow query threshold"
+)
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, by engine",
+    WAIT_BUCKETS,
+)
+
+REGISTRY = [
+    http_requests,
+    http_duration,
+    request_queries,
+    request_query_time,
+    db_queries,
+    db_query_time,
+    db_slow_queries,
+    pool_wait,
+]
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "query_time")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.query_time = 0.0
+
+    @property
+    def route(self) -> str:
+        # The route template keeps the label set small ("/contacts/{id}").
+        # The router stores the matched route in the scope.
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+# Set by the middleware, read by the engine hooks. SQLAlchemy's greenlets run
+# in the caller's context, so async sessions see the request's stats as well.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, StreamingResponses are timed until the last
+    chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            method = scope["method"]
+            route = stats.route
+            http_requests.inc(method=method, route=route, status=str(status_code))
+            http_duration.observe(elapsed, method=method, route=route)
+            request_queries.observe(stats.queries, method=method, route=route)
+            request_query_time.observe(stats.query_time, method=method, route=route)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement of a (sync) engine; for async engines
+    pass ``async_engine.sync_engine``."""
+
+    # A connection runs one statement at a time. after_cursor_execute is
+    # skipped for failed statements, the next one overwrites their start.
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info.pop("query_start")
+        db_queries.inc(engine=name)
+        db_query_time.observe(elapsed, engine=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+        if elapsed >= SLOW_QUERY_SECONDS:
+            db_slow_queries.inc(engine=name)
+            logger.warning(
+                "Slow query (%.1f ms, %s engine, %s): %s",
+                elapsed * 1000,
+                name,
+                "no request" if stats is None else stats.scope["path"],
+                " ".join(statement.split())[:2000],
+            )
+
+
+class _TimedPoolMixin:
+    """Records how long a checkout waits for a free connection (including
+    opening a new one). The engine name is the pool's logging name."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(
+                time.perf_counter() - start, engine=self.logging_name or "default"
+            )
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
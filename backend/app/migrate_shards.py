@@ -0,0 +1,151 @@
+"""Move the contacts of the main database into shards.
+
+Run it with the server stopped and the MINIDRIVE_SHARDING/MINIDRIVE_SHARD_DIR
+settings the server will use, from the directory of minidrive.db:
+
+    MINIDRIVE_SHARDING=user python -m app.migrate_shards
+    MINIDRIVE_SHARDING=user python -m app.migrate_shards --purge
+
+Rows keep their ids and change sequence values, so sync tokens, cursors and
+ETags stay valid. Rows already in a shard are skipped, an interrupted run
+can simply be started again. --purge removes the copied rows from the main
+database afterwards.
+"""
+
+import argparse
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from app.database import (
+    Base,
+    add_missing_columns,
+    create_sqlite_engine,
+    engine,
+)
+from app.shards import (
+    SHARD_DIR,
+    SHARDING,
+    prepare_shard_file,
+    shard_name,
+    shard_path,
+)
+from app.sync import create_change_tracking
+
+
+def _columns(table: str) -> str:
+    return ", ".join(c.name for c in Base.metadata.tables[table].columns)
+
+
+def _copy_statements(owners: str):
+    contacts = f"SELECT id FROM src.contacts WHERE owner_id IN ({owners})"
+    # Communications first: the search index trigger on contacts indexes each
+    # contact together with its communications
+    return [
+        (
+            "communications",
+            f"INSERT OR IGNORE INTO communications ({_columns('communications')}) "
+            f"SELECT {_columns('communications')} FROM src.communications "
+            f"WHERE contact_id IN ({contacts})",
+        ),
+        (
+            "contacts",
+            f"INSERT OR IGNORE INTO contacts ({_columns('contacts')}) "
+            f"SELECT {_columns('contacts')} FROM src.contacts "
+            f"WHERE owner_id IN ({owners})",
+        ),
+        (
+            "contact_tombstones",
+            f"INSERT OR IGNORE INTO contact_tombstones "
+            f"({_columns('contact_tombstones')}) "
+            f"SELECT {_columns('contact_tombstones')} FROM src.contact_tombstones "
+            f"WHERE owner_id IN ({owners})",
+        ),
+    ]
+
+
+def _purge_statements(owners: str):
+    contacts = f"SELECT id FROM src.contacts WHERE owner_id IN ({owners})"
+    return [
+        f"DELETE FROM src.communications WHERE contact_id IN ({contacts})",
+        f"DELETE FROM src.contacts WHERE owner_id IN ({owners})",
+        # Written by the delete trigger just now
+        f"DELETE FROM src.contact_tombstones WHERE owner_id IN ({owners})",
+    ]
+
+
+def migrate(sharding: str, directory: str, purge: bool = False) -> None:
+    # Columns added since the main database was last opened by the server
+    add_missing_columns(bind=engine)
+    create_change_tracking(bind=engine)
+    main_path = os.path.abspath(engine.url.database)
+
+    with engine.connect() as conn:
+        owner_ids = conn.execute(
+            text(
+                "SELECT owner_id FROM contacts UNION "
+                "SELECT owner_id FROM contact_tombstones"
+            )
+        ).scalars()
+        shards = defaultdict(list)
+        for owner_id in owner_ids:
+            shards[shard_name(owner_id, sharding)].append(owner_id)
+        sequence = conn.execute(
+            text("SELECT value, pruned FROM change_sequence WHERE id = 1")
+        ).one()
+
+    for name, owners in sorted(shards.items()):
+        start = time.perf_counter()
+        path = shard_path(name, directory)
+        prepare_shard_file(path)
+        shard = create_sqlite_engine(f"sqlite:///{path}", name="shard-migration")
+        # Owner ids come from the database, they are integers
+        owner_list = ",".join(str(int(owner_id)) for owner_id in owners)
+        counts = {}
+        try:
+            with shard.connect() as conn:
+                conn.exec_driver_sql("ATTACH DATABASE ? AS src", (main_path,))
+                for table, statement in _copy_statements(owner_list):
+                    counts[table] = conn.execute(text(statement)).rowcount
+                # New changes in the shard continue behind the copied ones
+                conn.execute(
+                    text(
+                        "UPDATE change_sequence SET value = max(value, :value), "
+                        "pruned = max(pruned, :pruned) WHERE id = 1"
+                    ),
+                    {"value": sequence.value, "pruned": sequence.pruned},
+                )
+                if purge:
+                    for statement in _purge_statements(owner_list):
+                        conn.execute(text(statement))
+                conn.commit()
+                conn.exec_driver_sql("DETACH DATABASE src")
+        finally:
+            shard.dispose()
+        print(
+            f"{name}: {len(owners)} users, {counts['contacts']} contacts, "
+            f"{counts['communications']} communications, "
+            f"{counts['contact_tombstones']} tombstones "
+            f"({time.perf_counter() - start:.1f}s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sharding", default=SHARDING, help="user or a number")
+    parser.add_argument("--shard-dir", default=SHARD_DIR)
+    parser.add_argument(
+        "--purge", action="store_true", help="delete copied rows from the main db"
+    )
+    args = parser.parse_args()
+    if not args.sharding:
+        parser.error("set MINIDRIVE_SHARDING or pass --sharding")
+    migrate(args.sharding, args.shard_dir, purge=args.purge)
+
+
+if __name__ == "__main__":
+    main()
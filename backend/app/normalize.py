@@ -0,0 +1,89 @@
+import hashlib
+import re
+from typing import Iterable, Optional, Tuple
+
+# Numbers written without country code ("(05435) 151626") are assumed to be
+# German, like the rest of the imported data.
+DEFAULT_COUNTRY_CODE = "49"
+
+_NON_DIGITS = re.compile(r"\D")
+_TRUNK_PREFIX = re.compile(r"^(\+\d{1,3})\s*\(0\)")
+
+
+def normalize_phone(value: str) -> str:
+    """E.164 style representation: "+49(0)1966 840149" -> "+491966840149"."""
+    value = value.strip()
+    trunk = _TRUNK_PREFIX.match(value)
+    if trunk:
+        # "+49(0)0261 ..." -> the national trunk zero is never dialled
+        value = trunk.group(1) + value[trunk.end() :].lstrip(" 0")
+    if value.startswith("+"):
+        return "+" + _NON_DIGITS.sub("", value)
+    digits = _NON_DIGITS.sub("", value)
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith("0"):
+        return "+" + DEFAULT_COUNTRY_CODE + digits.lstrip("0")
+    return digits
+
+
+def normalize_email(value: str) -> str:
+    value = value.strip()
+    if value.lower().startswith("mailto:"):
+        value = value[7:]
+    return value.casefold()
+
+
+def normalize_communication(comm_type: str, value: str) -> Optional[str]:
+    """Lookup key stored in Communication.normalized_value."""
+    if comm_type == "phone":
+        return normalize_phone(value)
+    if comm_type == "email":
+        return normalize_email(value)
+    return None
+
+
+# Re-imported exports are matched against the existing contacts instead of
+# being inserted again, by two 64 bit hashes (SQLite integers) per contact:
+# the fingerprint says who a contact is (name and company, ignoring case and
+# spacing), the content hash covers everything an import writes.
+def _hash(parts) -> int:
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big", signed=True)
+
+
+def _canonical(value: Optional[str]) -> str:
+    return " ".join((value or "").split()).casefold()
+
+
+def contact_hashes(
+    first_name: Optional[str],
+    last_name: Optional[str],
+    company: Optional[str],
+    notes: Optional[str],
+    address: Optional[str],
+    photo_sha256: Optional[str],
+    communications: Iterable[Tuple[str, Optional[str], str, Optional[str]]],
+) -> Tuple[int, int]:
+    """(fingerprint, content_hash). Communications are (comm_type, label,
+    value, normalized_value) tuples in any order; phone numbers and e-mail
+    addresses compare by their normalized value."""
+    fingerprint = _hash(
+        (_canonical(first_name), _canonical(last_name), _canonical(company))
+    )
+    comms = sorted(
+        f"{comm_type}\x1e{label or ''}\x1e{value if normalized is None else normalized}"
+        for comm_type, label, value, normalized in communications
+    )
+    content_hash = _hash(
+        (
+            first_name or "",
+            last_name or "",
+            company or "",
+            notes or "",
+            address or "",
+            photo_sha256 or "",
+            *comms,
+        )
+    )
+    return fingerprint, content_hash
@@ -1,11 +1,483 @@
-from typing import List
+import base64
+import binascii
+import quopri
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import vobject
 
+from app.normalize import contact_hashes, normalize_communication
 from app.pydantic_schema import schema
 
+# Only these properties end up in a contact, everything else is skipped
+# without parsing its parameters.
+_WANTED = frozenset({"N", "FN", "ORG", "NOTE", "ADR", "TEL", "EMAIL", "PHOTO"})
+_SINGLE = frozenset({"N", "FN", "ORG", "NOTE", "ADR"})
+
+# vCard 2.1 allows encodings as bare parameters (e.g. "NOTE;QUOTED-PRINTABLE:")
+_BARE_ENCODINGS = frozenset({"QUOTED-PRINTABLE", "BASE64", "B", "8BIT", "7BIT"})
+
+# Photos are served back as they are, so only image formats no browser
+# mistakes for a document are kept, recognized by their first bytes
+_PHOTO_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+MAX_PHOTO_BYTES = 5 * 1024 * 1024
+
+# Files are read line by line and grouped card by card. Longer lines and
+# cards are rejected, so memory stays bounded whatever is uploaded. A photo
+# may come as one unfolded base64 line.
+MAX_LINE_BYTES = (MAX_PHOTO_BYTES + 2) // 3 * 4 + 64 * 1024
+MAX_CARD_BYTES = 2 * MAX_LINE_BYTES
+# Chunks of cards with photos are cut at this size already
+MAX_CHUNK_BYTES = 32 * 1024 * 1024
+
+_ESCAPES = {"n": "\n", "N": "\n", ",": ",", ";": ";", ":": ":", "\\": "\\"}
+
+
+class VCardParseError(ValueError):
+    """Input is not a vCard the native parser understands."""
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    length = len(value)
+    while i < length:
+        ch = value[i]
+        if ch == "\\" and i + 1 < length:
+            nxt = value[i + 1]
+            out.append(_ESCAPES.get(nxt, nxt))
+            i += 2
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def _split_structured(value: str) -> List[str]:
+    """Split a structured value (N, ADR, ORG) on unescaped semicolons."""
+    if "\\" not in value:
+        return value.split(";")
+    parts = []
+    current = []
+    i = 0
+    length = len(value)
+    while i < length:
+        ch = value[i]
+        if ch == "\\" and i + 1 < length:
+            current.append(value[i : i + 2])
+            i += 2
+            continue
+        if ch == ";":
+            parts.append(_unescape("".join(current)))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    parts.append(_unescape("".join(current)))
+    return parts
+
+
+def _split_quoted(text: str, sep: str) -> List[str]:
+    """Split on sep, ignoring separators inside double quotes."""
+    if '"' not in text:
+        return text.split(sep)
+    parts = []
+    current = []
+    quoted = False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif ch == sep and not quoted:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+
+def _parse_params(raw: List[str]) -> Dict[str, List[str]]:
+    params: Dict[str, List[str]] = {}
+    for param in raw:
+        if not param:
+            continue
+        key, sep, value = param.partition("=")
+        if not sep:
+            # vCard 2.1 style: "TEL;CELL;VOICE:..."
+            value = key
+            key = "ENCODING" if key.upper() in _BARE_ENCODINGS else "TYPE"
+        values = params.setdefault(key.strip().upper(), [])
+        for v in _split_quoted(value, ","):
+            v = v.strip().strip('"')
+            if v:
+                values.append(v)
+    return params
+
+
+def _logical_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Unfold continuation lines (RFC 6350 3.2) and quoted-printable soft breaks."""
+    pending: Optional[str] = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if pending is None:
+            pending = line
+            continue
+        if line[:1] in (" ", "\t"):
+            pending += line[1:]
+        elif (
+            pending.endswith("=")
+            and "QUOTED-PRINTABLE" in pending.partition(":")[0].upper()
+        ):
+            pending = pending[:-1] + line
+        else:
+            yield pending
+            pending = line
+    if pending is not None:
+        yield pending
+
+
+def _split_line(line: str) -> Tuple[str, List[str], str]:
+    """Split a content line into (name, raw params, value)."""
+    colon = line.find(":")
+    if colon < 0:
+        raise VCardParseError(f"Invalid content line: {line[:40]!r}")
+    head = line[:colon]
+    if '"' in head:
+        # A quoted parameter value may contain ':' itself
+        quoted = False
+        for i, ch in enumerate(line):
+            if ch == '"':
+                quoted = not quoted
+            elif ch == ":" and not quoted:
+                colon = i
+                break
+        head = line[:colon]
+    parts = _split_quoted(head, ";")
+    name = parts[0].rpartition(".")[2].strip().upper()
+    return name, parts[1:], line[colon + 1 :]
+
+
+def _decode(value: str, params: Dict[str, List[str]]) -> str:
+    encoding = params.get("ENCODING")
+    if encoding and encoding[0].upper() == "QUOTED-PRINTABLE":
+        charset = params.get("CHARSET", ["utf-8"])[0]
+        try:
+            raw = quopri.decodestring(value.encode("ascii"))
+            return raw.decode(charset)
+        except (UnicodeError, LookupError) as e:
+            raise VCardParseError(f"Cannot decode quoted-printable value: {e}")
+    return value
+
+
+def _build_contact(
+    props: Dict[str, str], phones: list, emails: list
+) -> schema.ContactCreate:
+    first_name = ""
+    last_name = ""
+
+    if "N" in props:
+        n = _split_structured(props["N"])
+        last_name = n[0]
+        first_name = n[1] if len(n) > 1 else ""
+    elif "FN" in props:
+        parts = _unescape(props["FN"]).split(" ", 1)
+        if len(parts) == 2:
+            first_name, last_name = parts
+        else:
+            first_name = parts[0]
+
+    company = _split_structured(props["ORG"])[0] if "ORG" in props else ""
+    notes = _unescape(props["NOTE"]) if "NOTE" in props else ""
+
+    address = ""
+    if "ADR" in props:
+        adr = _split_structured(props["ADR"]) + [""] * 7
+        # pobox;ext;street;city;region;code;country
+        addr_parts = [adr[2], adr[3], adr[5], adr[6]]
+        address = ", ".join([p for p in addr_parts if p])
+
+    # Values are plain strings at this point, validation would only cost time
+    return schema.ContactCreate.model_construct(
+        first_name=first_name,
+        last_name=last_name,
+        company=company,
+        notes=notes,
+        address=address,
+        communications=phones + emails,
+    )
+
+
+def decode_photo(
+    value: str, params: Dict[str, List[str]]
+) -> Optional[Tuple[bytes, str]]:
+    """Inline PHOTO data as (bytes, media type). None for references (URLs),
+    images above MAX_PHOTO_BYTES and anything that is not a JPEG, PNG, GIF
+    or WebP image."""
+    if value[:5].lower() == "data:":
+        # vCard 4.0: data:image/jpeg;base64,...
+        header, _, value = value.partition(",")
+        if not header.lower().endswith(";base64"):
+            return None
+    else:
+        # vCard 3.0 ENCODING=b, 2.1 ENCODING=BASE64
+        encoding = params.get("ENCODING")
+        if not encoding or encoding[0].upper() not in ("B", "BASE64"):
+            return None
+    if len(value) > (MAX_PHOTO_BYTES + 2) // 3 * 4 + 64:
+        return None
+    try:
+        # Whitespace left over from folding is skipped
+        data = base64.b64decode(value)
+    except (binascii.Error, ValueError):
+        return None
+    if len(data) > MAX_PHOTO_BYTES:
+        return None
+    for signature, media_type in _PHOTO_SIGNATURES:
+        if data.startswith(signature):
+            return data, media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return data, "image/webp"
+    return None
+
+
+def iter_vcards(lines: Iterable[str]) -> Iterator[schema.ContactCreate]:
+    """Single pass line-oriented parser for vCard 2.1/3.0/4.0.
+
+    Yields one ContactCreate per BEGIN:VCARD ... END:VCARD block and raises
+    VCardParseError for input it does not understand.
+    """
+    for contact, _ in _iter_cards(lines):
+        yield contact
+
+
+def _iter_cards(lines: Iterable[str]):
+    """iter_vcards, paired with the card's first PHOTO as (raw value,
+    params) or None. Decoding is left to the caller (decode_photo), most
+    callers do not need the photos."""
+    in_card = False
+    has_version = False
+    found = False
+    props: Dict[str, str] = {}
+    phones: list = []
+    emails: list = []
+    photo = None
+
+    for line in _logical_lines(lines):
+        if not line.strip():
+            continue
+        name, raw_params, value = _split_line(line)
+
+        if name == "BEGIN":
+            if value.strip().upper() != "VCARD" or in_card:
+                raise VCardParseError(f"Unexpected BEGIN:{value.strip()}")
+            in_card = True
+            has_version = False
+            props = {}
+            phones = []
+            emails = []
+            photo = None
+            continue
+        if not in_card:
+            raise VCardParseError("Content outside of BEGIN:VCARD/END:VCARD")
+        if name == "END":
+            if value.strip().upper() != "VCARD":
+                raise VCardParseError(f"Unexpected END:{value.strip()}")
+            if not has_version:
+                raise VCardParseError("vCard without VERSION")
+            in_card = False
+            found = True
+            yield _build_contact(props, phones, emails), photo
+            continue
+        if name == "VERSION":
+            has_version = True
+            continue
+        if name not in _WANTED:
+            continue
+
+        params = _parse_params(raw_params)
+        if "ENCODING" in params:
+            value = _decode(value, params)
+
+        if name in _SINGLE:
+            props.setdefault(name, value)
+            continue
+        if name == "PHOTO":
+            if photo is None:
+                photo = (value, params)
+            continue
+
+        # TEL / EMAIL, phones first like the vobject based parser
+        if name == "TEL":
+            comm_type = "phone"
+            target = phones
+            if value[:4].lower() == "tel:":
+                value = value[4:]
+        else:
+            comm_type = "email"
+            target = emails
+        types = params.get("TYPE")
+        label = ",".join(types) if types else comm_type
+        target.append(
+            schema.CommunicationCreate.model_construct(
+                comm_type=comm_type, label=label.lower(), value=_unescape(value)
+            )
+        )
+
+    if in_card:
+        raise VCardParseError("Missing END:VCARD")
+    if not found:
+        raise VCardParseError("No vCard found")
+
+
+def vcard_boundary(line: bytes) -> int:
+    """1 for a BEGIN:VCARD line, -1 for END:VCARD, 0 for anything else."""
+    first = line[:1]
+    if first in (b"B", b"b"):
+        return 1 if line[:11].upper() == b"BEGIN:VCARD" else 0
+    if first in (b"E", b"e"):
+        return -1 if line[:9].upper() == b"END:VCARD" else 0
+    return 0
+
+
+def iter_lines(file: BinaryIO, max_length: int = MAX_LINE_BYTES) -> Iterator[bytes]:
+    """The lines of a binary file; raises VCardParseError for a line longer
+    than ``max_length`` (newline included) instead of reading all of it."""
+    while True:
+        line = file.readline(max_length + 1)
+        if not line:
+            return
+        if len(line) > max_length:
+            raise VCardParseError(f"Line longer than {max_length} bytes")
+        yield line
+
+
+def iter_vcard_chunks(
+    lines: Iterable[bytes],
+    cards_per_chunk: int,
+    skip: int = 0,
+    max_card_bytes: int = MAX_CARD_BYTES,
+    max_chunk_bytes: int = MAX_CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """Group raw lines into blocks of ``cards_per_chunk`` complete vCards,
+    fewer once a block reaches ``max_chunk_bytes``.
+
+    Only the card boundaries are looked at, so a large file can be parsed
+    chunk by chunk (parse_vcards) with memory bounded by the chunk size.
+    The first ``skip`` cards are dropped, lines after the last card too.
+    Raises VCardParseError for a card (or anything between two cards)
+    larger than ``max_card_bytes``.
+    """
+    chunk: List[bytes] = []
+    depth = 0
+    cards = 0
+    size = 0
+    # Since the end of the last complete card
+    pending = 0
+    for line in lines:
+        boundary = vcard_boundary(line)
+        if skip:
+            depth += boundary
+            if boundary < 0 and depth == 0:
+                skip -= 1
+            continue
+        chunk.append(line)
+        size += len(line)
+        pending += len(line)
+        if pending > max_card_bytes:
+            raise VCardParseError(f"vCard larger than {max_card_bytes} bytes")
+        if not boundary:
+            continue
+        depth += boundary
+        # Nested cards (vCard 2.1 AGENT) belong to the enclosing one
+        if boundary < 0 and depth == 0:
+            cards += 1
+            pending = 0
+            if cards == cards_per_chunk or size >= max_chunk_bytes:
+                yield b"".join(chunk)
+                chunk = []
+                cards = 0
+                size = 0
+    if cards or depth:
+        # An unterminated card is left to the parser to report
+        yield b"".join(chunk)
+
 
 def parse_vcards(vcf_content: str) -> List[schema.ContactCreate]:
+    try:
+        return list(iter_vcards(vcf_content.split("\n")))
+    except VCardParseError:
+        # Exotic input (nested AGENT cards, broken folding, ...) -> vobject
+        return _parse_vcards_vobject(vcf_content)
+
+
+def contact_row(
+    contact: schema.ContactCreate,
+    photo_sha256: Optional[str] = None,
+    photo_type: Optional[str] = None,
+) -> tuple:
+    """A contact as a plain tuple: (first_name, last_name, company, notes,
+    address, [(comm_type, label, value, normalized_value), ...],
+    photo_sha256, photo_type, fingerprint, content_hash)."""
+    communications = [
+        (m.comm_type, m.label, m.value, normalize_communication(m.comm_type, m.value))
+        for m in contact.communications or []
+    ]
+    fingerprint, content_hash = contact_hashes(
+        contact.first_name,
+        contact.last_name,
+        contact.company,
+        contact.notes,
+        contact.address,
+        photo_sha256,
+        communications,
+    )
+    return (
+        contact.first_name,
+        contact.last_name,
+        contact.company,
+        contact.notes,
+        contact.address,
+        communications,
+        photo_sha256,
+        photo_type,
+        fingerprint,
+        content_hash,
+    )
+
+
+def parse_vcard_chunk(raw: bytes, photo_store=None) -> List[tuple]:
+    """parse_vcards for a block from iter_vcard_chunks, as contact_row
+    tuples. Meant for worker processes: tuples pickle about ten times faster
+    than the models and can be inserted without rebuilding them, normalized
+    values and fingerprints are computed on the way.
+
+    With a ``photo_store`` (blobs.BlobStore) inline photos are decoded and
+    written to it right here, only their digests travel back. The vobject
+    fallback drops photos."""
+    text = raw.decode("utf-8")
+    rows = []
+    try:
+        for contact, photo in _iter_cards(text.split("\n")):
+            photo = decode_photo(*photo) if photo and photo_store else None
+            if photo is None:
+                rows.append(contact_row(contact))
+            else:
+                data, media_type = photo
+                rows.append(contact_row(contact, photo_store.put(data), media_type))
+    except VCardParseError:
+        # Photos stored up to here stay unreferenced, the store keeps them
+        return [contact_row(c) for c in _parse_vcards_vobject(text)]
+    return rows
+
+
+def _parse_vcards_vobject(vcf_content: str) -> List[schema.ContactCreate]:
+    """Slow but lenient parser, only used as fallback for exotic input."""
     contacts = []
 
     vcards = list(vobject.readComponents(vcf_content))
@@ -0,0 +1,89 @@
+from typing import Iterable, List, Sequence, Tuple
+
+# Communication types with a vCard property, others are not exported
+_PROPERTIES = {"phone": "TEL", "email": "EMAIL"}
+
+
+# Parameter values cannot be escaped, drop what would end the parameter
+_PARAM_TABLE = str.maketrans({";": "", ":": "", "\n": "", "\r": "", '"': ""})
+
+# RFC 2425: lines longer than 75 octets are folded
+_MAX_LINE_OCTETS = 75
+
+
+def _escape(value) -> str:
+    # str.replace is a lot faster than str.translate for mostly clean text
+    if not value:
+        return ""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r", "")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    if len(line) <= _MAX_LINE_OCTETS and (
+        line.isascii() or len(line.encode()) <= _MAX_LINE_OCTETS
+    ):
+        return line
+    parts = []
+    current = []
+    size = 0
+    for ch in line:
+        octets = len(ch.encode())
+        # Continuation lines start with a space, which counts as well
+        if size + octets > _MAX_LINE_OCTETS:
+            parts.append("".join(current))
+            current = [" "]
+            size = 1
+        current.append(ch)
+        size += octets
+    parts.append("".join(current))
+    return "\r\n".join(parts)
+
+
+def format_vcard(contact, communications: Sequence) -> str:
+    """vCard 3.0 representation of a contact, CRLF terminated. Works with
+    ORM objects as well as plain rows.
+
+    The address is stored as one string and therefore written as street,
+    which ``iter_vcards`` reads back unchanged.
+    """
+    first_name = _escape(contact.first_name)
+    last_name = _escape(contact.last_name)
+    full_name = " ".join(p for p in (contact.first_name, contact.last_name) if p)
+    lines: List[str] = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:{last_name};{first_name};;;",
+        f"FN:{_escape(full_name)}",
+    ]
+    if contact.company:
+        lines.append(f"ORG:{_escape(contact.company)}")
+    if contact.address:
+        lines.append(f"ADR:;;{_escape(contact.address)};;;;")
+    if contact.notes:
+        lines.append(f"NOTE:{_escape(contact.notes)}")
+
+    for comm in communications:
+        prop = _PROPERTIES.get(comm.comm_type)
+        if prop is None:
+            continue
+        label = comm.label
+        if label and label != comm.comm_type:
+            # Labels come from TYPE parameters ("cell,voice"), keep the commas
+            types = label.translate(_PARAM_TABLE)
+            lines.append(f"{prop};TYPE={types}:{_escape(comm.value)}")
+        else:
+            lines.append(f"{prop}:{_escape(comm.value)}")
+
+    lines.append("END:VCARD")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+def format_vcards(contacts: Iterable[Tuple[object, Sequence]]) -> str:
+    """Concatenated vCards of (contact, communications) pairs."""
+    return "".join(format_vcard(contact, comms) for contact, comms in contacts)
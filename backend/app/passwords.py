@@ -0,0 +1,12 @@
+import bcrypt
+
+# bcrypt calls of the hash pool (app/auth.py). The pool spawns its workers,
+# which import only this module instead of the app.
+
+
+def check_password(pre_hashed: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(pre_hashed, hashed_password)
+
+
+def hash_password(pre_hashed: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(pre_hashed, bcrypt.gensalt(rounds)).decode("utf-8")
@@ -1,7 +1,9 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+MAX_BATCH_OPERATIONS = 1000
 
 
 class UserBase(BaseModel):
@@ -55,6 +57,71 @@ class ContactResponse(ContactBase):
     id: int
     modified: Optional[datetime] = None
     created: Optional[datetime] = None
+    # Set when the contact has a photo: GET /contacts/{id}/photo?v=<photo_sha256>
+    # may be cached forever
+    photo_sha256: Optional[str] = None
     communications: List[Communication] = []
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactChanges(BaseModel):
+    changed: List[ContactResponse]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
+
+
+class ContactBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None  # update / delete
+    contact: Optional[ContactUpdate] = None  # create / update
+
+
+class ContactBatchRequest(BaseModel):
+    operations: List[ContactBatchOperation] = Field(max_length=MAX_BATCH_OPERATIONS)
+
+
+class ContactBatchResult(BaseModel):
+    op: str
+    id: Optional[int] = None
+    status: int
+    detail: Optional[str] = None
+    contact: Optional[ContactResponse] = None
+
+
+class ContactBatchResponse(BaseModel):
+    results: List[ContactBatchResult]
+
+
+class ImportJobResponse(BaseModel):
+    id: int
+    filename: Optional[str] = None
+    state: str
+    total: Optional[int] = None
+    processed: int = 0
+    updated: Optional[int] = None
+    unchanged: Optional[int] = None
+    error: Optional[str] = None
+    created: Optional[datetime] = None
+    started: Optional[datetime] = None
+    finished: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field
+    @property
+    def contacts_per_second(self) -> Optional[float]:
+        if self.started is None or not self.processed:
+            return None
+        # SQLite returns naive UTC datetimes, new objects are aware
+        end = self.finished or datetime.now(timezone.utc)
+        elapsed = (
+            end.replace(tzinfo=None) - self.started.replace(tzinfo=None)
+        ).total_seconds()
+        return round(self.processed / elapsed, 1) if elapsed > 0 else None
@@ -0,0 +1,74 @@
+import os
+from datetime import datetime
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from fastapi import Response
+
+from app import metrics
+from app.cache import LRUCache
+from app.events import on_contact_changes
+
+# Serialized bodies of GET /contacts/ and GET /contacts/{id}: repeated reads
+# of an unchanged address book skip SQLite and serialization. Each owner has
+# a version that every commit changing their contacts increments (the write
+# paths in crud record their changes, see events.record_changes). Entries
+# are keyed by it, so an entry of an older version is never served and just
+# ages out. Only commits of this process are seen: with several server
+# processes, or other programs writing to the database, turn it off with
+# MINIDRIVE_RESPONSE_CACHE_MB=0.
+RESPONSE_CACHE_MB = float(os.environ.get("MINIDRIVE_RESPONSE_CACHE_MB", "64"))
+
+
+class CachedResponse(NamedTuple):
+    headers: Dict[str, str]
+    body: bytes
+    # For If-Modified-Since
+    last_modified: Optional[datetime] = None
+
+    def response(self) -> Response:
+        return Response(self.body, media_type="application/json", headers=self.headers)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.enabled = max_bytes > 0
+        self._entries = LRUCache(
+            maxsize=max_bytes, weigh=lambda response: len(response.body)
+        )
+        self._versions: Dict[int, int] = {}
+
+    def version(self, owner_id: int) -> int:
+        """Read it before the database, a response built afterwards is at
+        least as new as this version."""
+        return self._versions.get(owner_id, 0)
+
+    def invalidate(self, owner_id: int) -> None:
+        self._versions[owner_id] = self.version(owner_id) + 1
+
+    def get(
+        self, owner_id: int, version: int, key: Hashable
+    ) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        return self._entries.get((owner_id, version, key))
+
+    def set(
+        self, owner_id: int, version: int, key: Hashable, response: CachedResponse
+    ) -> None:
+        if self.enabled:
+            self._entries.set((owner_id, version, key), response)
+
+    def stats(self) -> Dict[str, float]:
+        return self._entries.stats()
+
+
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+on_contact_changes(response_cache.invalidate)
+metrics.REGISTRY.append(
+    metrics.CacheMetrics(
+        "response_cache",
+        "Serialized contact responses",
+        response_cache.stats,
+        weight_unit="bytes",
+    )
+)
@@ -0,0 +1,16 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+
+class FastJSONResponse(Response):
+    """JSON rendered with orjson, for endpoints that return plain dicts
+    already shaped like their response model. FastAPI skips validation and
+    serialization for returned Response objects, the response_model is
+    still used for the OpenAPI schema."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
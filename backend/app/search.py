@@ -0,0 +1,247 @@
+import re
+from typing import List, Optional, Set
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.normalize import DEFAULT_COUNTRY_CODE
+
+# Full-text index over contacts and their communications (SQLite FTS5).
+# rowid is the contact id, the table is kept in sync by triggers so every
+# write path (ORM, bulk import, cascades) updates it.
+# Phone numbers are additionally indexed without separators ("026198"
+# finds "0261/98765") and, for numbers of the default country, in national
+# form: "01966840" finds "+49(0)1966840149" (normalized "+491966840149",
+# indexed as "01966840149" as well).
+_NATIONAL_PREFIX = "+" + DEFAULT_COUNTRY_CODE
+_NATIONAL_FORM = (
+    f"CASE WHEN comm_type = 'phone' AND substr(normalized_value, 1, "
+    f"{len(_NATIONAL_PREFIX)}) = '{_NATIONAL_PREFIX}' "
+    f"THEN ' 0' || substr(normalized_value, {len(_NATIONAL_PREFIX) + 1}) "
+    f"ELSE '' END"
+)
+_COMM_TEXT = (
+    """(
+    SELECT group_concat(value || ' ' || replace(replace(replace(replace(replace(
+        value, ' ', ''), '(', ''), ')', ''), '-', ''), '/', '') || """
+    + _NATIONAL_FORM
+    + """, ' ')
+    FROM communications WHERE contact_id = {contact_id}
+)"""
+)
+
+_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+        first_name, last_name, company, notes, address, communications,
+        owner_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts_vocab "
+    "USING fts5vocab(contacts_fts, 'row')",
+    f"""CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts (rowid, first_name, last_name, company, notes,
+                                  address, communications, owner_id)
+        VALUES (new.id, new.first_name, new.last_name, new.company, new.notes,
+                new.address,
+                coalesce({_COMM_TEXT.format(contact_id="new.id")}, ''),
+                new.owner_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF
+        first_name, last_name, company, notes, address ON contacts BEGIN
+        UPDATE contacts_fts SET first_name = new.first_name,
+            last_name = new.last_name, company = new.company,
+            notes = new.notes, address = new.address
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        DELETE FROM contacts_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS communications_fts_ai
+        AFTER INSERT ON communications BEGIN
+        UPDATE contacts_fts
+        SET communications = {_COMM_TEXT.format(contact_id="new.contact_id")}
+        WHERE rowid = new.contact_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS communications_fts_au
+        AFTER UPDATE ON communications BEGIN
+        UPDATE contacts_fts
+        SET communications = {_COMM_TEXT.format(contact_id="new.contact_id")}
+        WHERE rowid = new.contact_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS communications_fts_ad
+        AFTER DELETE ON communications BEGIN
+        UPDATE contacts_fts
+        SET communications = {_COMM_TEXT.format(contact_id="old.contact_id")}
+        WHERE rowid = old.contact_id;
+    END""",
+]
+
+_BACKFILL = f"""
+INSERT INTO contacts_fts (rowid, first_name, last_name, company, notes, address,
+                          communications, owner_id)
+SELECT c.id, c.first_name, c.last_name, c.company, c.notes, c.address,
+       coalesce({_COMM_TEXT.format(contact_id="c.id")}, ''), c.owner_id
+FROM contacts c
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Typo tolerance: terms with at least this many characters may differ from
+# indexed terms by one edit (two for long terms). Candidates sharing the
+# first _FUZZY_PREFIX characters come from a range scan on the vocabulary,
+# a typo within them is found by looking up the term's variants with one
+# edit there. The closest (then most frequent) candidates that occur in the
+# owner's contacts are used.
+_FUZZY_MIN_LENGTH = 4
+_FUZZY_PREFIX = 2
+_FUZZY_MAX_CANDIDATES = 5
+# Candidates looked up in the owner's contacts, at most
+_FUZZY_MAX_CHECKS = 20
+# Inserted and substituted characters of the variants besides the term's
+# own: digits for terms with digits, letters otherwise (remove_diacritics
+# folds accented letters)
+_FUZZY_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+_FUZZY_DIGITS = "0123456789"
+
+
+def _stored_form(statement: str) -> str:
+    # sqlite_master keeps the statement without IF NOT EXISTS
+    return statement.replace(" IF NOT EXISTS", "", 1)
+
+
+def create_search_index(bind):
+    """Create the FTS table and triggers, filling it once for existing rows.
+
+    Triggers from an older definition are replaced and the index is filled
+    again, so changes to the indexed text apply to existing contacts."""
+    triggers = {
+        statement.split()[5]: statement
+        for statement in _DDL
+        if statement.startswith("CREATE TRIGGER")
+    }
+    with bind.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'contacts_fts'")
+        ).first()
+        stored = dict(
+            conn.execute(
+                text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+            ).all()
+        )
+        outdated = [
+            name
+            for name, statement in triggers.items()
+            if name in stored and stored[name] != _stored_form(statement)
+        ]
+        for name in outdated:
+            conn.execute(text(f"DROP TRIGGER {name}"))
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if outdated:
+            conn.execute(text("DELETE FROM contacts_fts"))
+        if not exists or outdated:
+            conn.execute(text(_BACKFILL))
+
+
+def tokenize(query: str) -> List[str]:
+    return [t.lower() for t in _TOKEN.findall(query)]
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match(terms: List[str], expansions=None) -> str:
+    """Every term has to match as a prefix, optionally OR-ed with
+    similar indexed terms."""
+    parts = []
+    for term in terms:
+        alternatives = [term] + (expansions or {}).get(term, [])
+        options = " OR ".join(_quote(t) + "*" for t in alternatives)
+        parts.append(f"({options})" if len(alternatives) > 1 else options)
+    return " AND ".join(parts)
+
+
+def _distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Levenshtein distance, None above max_distance (stopping early)."""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        if min(current) > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+def _prefix_variants(term: str) -> Set[str]:
+    """Terms one edit away from ``term``, the edit within the prefix."""
+    alphabet = _FUZZY_DIGITS if any(c.isdigit() for c in term) else _FUZZY_LETTERS
+    characters = set(alphabet) | set(term)
+    variants = set()
+    for i in range(_FUZZY_PREFIX):
+        variants.add(term[:i] + term[i + 1 :])
+        for c in characters:
+            variants.add(term[:i] + c + term[i + 1 :])
+            variants.add(term[:i] + c + term[i:])
+    variants.discard(term)
+    return variants
+
+
+async def similar_terms(db: AsyncSession, term: str, owner_id: int) -> List[str]:
+    """Indexed terms of the owner's contacts within edit distance of
+    ``term``, closest first."""
+    if len(term) < _FUZZY_MIN_LENGTH:
+        return []
+    max_distance = 1 if len(term) < 8 else 2
+    prefix = term[:_FUZZY_PREFIX]
+    scanned = await db.execute(
+        text(
+            "SELECT term, doc FROM contacts_fts_vocab "
+            "WHERE term >= :lo AND term < :hi "
+            "AND length(term) BETWEEN :min_len AND :max_len"
+        ),
+        {
+            "lo": prefix,
+            "hi": prefix + "\U0010ffff",
+            "min_len": len(term) - max_distance,
+            "max_len": len(term) + max_distance,
+        },
+    )
+    variants = list(_prefix_variants(term))
+    looked_up = await db.execute(
+        text(
+            "SELECT term, doc FROM contacts_fts_vocab WHERE term IN :variants"
+        ).bindparams(bindparam("variants", expanding=True)),
+        {"variants": variants},
+    )
+    ranked = []
+    # A variant can share the prefix as well
+    for candidate, docs in dict([*scanned, *looked_up]).items():
+        if candidate == term:
+            continue
+        distance = _distance(term, candidate, max_distance)
+        if distance is not None:
+            ranked.append((distance, -docs, candidate))
+    ranked.sort()
+
+    # The vocabulary covers all owners
+    candidates = []
+    for _, _, candidate in ranked[:_FUZZY_MAX_CHECKS]:
+        owned = await db.execute(
+            text(
+                "SELECT 1 FROM contacts_fts "
+                "WHERE contacts_fts MATCH :match AND owner_id = :owner_id LIMIT 1"
+            ),
+            {"match": _quote(candidate), "owner_id": owner_id},
+        )
+        if owned.first() is not None:
+            candidates.append(candidate)
+            if len(candidates) >= _FUZZY_MAX_CANDIDATES:
+                break
+    return candidates
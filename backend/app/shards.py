@@ -0,0 +1,162 @@
+import asyncio
+import os
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.database import (
+    Base,
+    add_missing_columns,
+    create_async_sqlite_engine,
+    create_missing_indexes,
+    create_sqlite_engine,
+)
+from app.search import create_search_index
+from app.sql_schema import models  # noqa: F401 (registers the tables)
+from app.sync import create_change_tracking, prune_tombstones
+
+# Optional storage mode with one SQLite file per user ("user") or per bucket
+# of users ("16": user id modulo 16). SQLite has one writer per file, so
+# imports and edits of users in different shards no longer wait for each
+# other. Users and import jobs stay in the main database. Empty: everything
+# in the main database.
+SHARDING = os.environ.get("MINIDRIVE_SHARDING", "")
+SHARD_DIR = os.environ.get("MINIDRIVE_SHARD_DIR", "shards")
+# Shards with open engines (a writer and a reader pool each)
+MAX_OPEN_SHARDS = int(os.environ.get("MINIDRIVE_MAX_OPEN_SHARDS", "32"))
+
+SHARD_TABLES = ("contacts", "communications", "contact_tombstones")
+
+
+def shard_name(user_id: int, sharding: str = SHARDING) -> Optional[str]:
+    if not sharding:
+        return None
+    if sharding == "user":
+        return f"user-{user_id}"
+    return f"bucket-{user_id % int(sharding)}"
+
+
+def shard_path(name: str, directory: str = SHARD_DIR) -> str:
+    return os.path.join(directory, f"{name}.db")
+
+
+def prepare_shard(bind) -> None:
+    """The main database's startup steps for the tables of a shard."""
+    tables = [Base.metadata.tables[name] for name in SHARD_TABLES]
+    Base.metadata.create_all(bind=bind, tables=tables)
+    add_missing_columns(bind=bind)
+    create_missing_indexes(bind=bind, tables=tables)
+    create_search_index(bind=bind)
+    create_change_tracking(bind=bind)
+    prune_tombstones(bind=bind)
+    with Session(bind) as db:
+        crud.backfill_fingerprints(db)
+
+
+def prepare_shard_file(path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    setup = create_sqlite_engine(f"sqlite:///{path}", name="shard-setup")
+    try:
+        prepare_shard(setup)
+    finally:
+        setup.dispose()
+
+
+class ShardRouter:
+    """Engines of the shards, opened on first use.
+
+    The schema of a shard is prepared once per process. Only the
+    ``max_open`` most recently used shards keep their engines. A shard is
+    closed only while no session uses it: a second writer engine on the
+    same file would break the single writer the id assignment relies on
+    (crud.insert_contact_rows). More stay open while sessions use them, the
+    surplus is closed when the next shard opens."""
+
+    def __init__(self, max_open: int = MAX_OPEN_SHARDS):
+        self.max_open = max_open
+        self._engines: "OrderedDict[str, Tuple[AsyncEngine, AsyncEngine]]" = (
+            OrderedDict()
+        )
+        # Sessions per shard that use its engines, see use_shard
+        self._users: Dict[str, int] = {}
+        self._prepared = set()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, user_id: int) -> Tuple[str, AsyncEngine, AsyncEngine]:
+        """Shard name, writer and reader engine of the user's shard. The
+        engines stay open until ``release`` is called with the name."""
+        name = shard_name(user_id)
+        engines = self._engines.get(name)
+        if engines is None:
+            async with self._lock:
+                engines = self._engines.get(name)
+                if engines is None:
+                    engines = await self._open(name)
+        self._engines.move_to_end(name)
+        self._users[name] = self._users.get(name, 0) + 1
+        return (name, *engines)
+
+    def release(self, name: str) -> None:
+        users = self._users.pop(name) - 1
+        if users:
+            self._users[name] = users
+
+    async def engines(self, user_id: int) -> Tuple[AsyncEngine, AsyncEngine]:
+        """Writer and reader engine of the user's shard, not pinned: they
+        are closed once other shards push them out."""
+        name, writer, reader = await self.acquire(user_id)
+        self.release(name)
+        return writer, reader
+
+    async def _open(self, name: str) -> Tuple[AsyncEngine, AsyncEngine]:
+        path = shard_path(name)
+        if name not in self._prepared:
+            await run_in_threadpool(prepare_shard_file, path)
+            self._prepared.add(name)
+        url = f"sqlite+aiosqlite:///{path}"
+        # Engine names are metric labels, they must not grow with the number
+        # of shards
+        engines = (
+            create_async_sqlite_engine(url, name="shard-writer"),
+            create_async_sqlite_engine(url, read_only=True, name="shard-reader"),
+        )
+        while len(self._engines) >= self.max_open:
+            # Checked again after every dispose, a session may have pinned
+            # a shard in the meantime
+            idle = next((n for n in self._engines if n not in self._users), None)
+            if idle is None:
+                break
+            for engine in self._engines.pop(idle):
+                await engine.dispose()
+        self._engines[name] = engines
+        return engines
+
+    async def dispose(self) -> None:
+        async with self._lock:
+            while self._engines:
+                _, engines = self._engines.popitem()
+                for engine in engines:
+                    await engine.dispose()
+
+
+shard_router = ShardRouter()
+
+
+async def use_shard(db: AsyncSession, user_id: int) -> None:
+    """Route the session's contact queries to the user's shard (see
+    database.RoutingSession). The engines are pinned to the session until it
+    closes, so a transaction never switches engines and the shard is not
+    closed under it. Does nothing without sharding."""
+    if not SHARDING:
+        return
+    name, writer, reader = await shard_router.acquire(user_id)
+    previous = db.info.pop("release_shard", None)
+    db.info["shard"] = (writer, reader)
+    db.info["release_shard"] = partial(shard_router.release, name)
+    if previous is not None:
+        previous()
@@ -3,9 +3,12 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    func,
+    literal_column,
 )
 from sqlalchemy.orm import relationship
 
@@ -24,6 +27,9 @@ class User(Base):
     contacts = relationship(
         "Contact", back_populates="owner", cascade="all, delete-orphan"
     )
+    import_jobs = relationship(
+        "ImportJob", back_populates="owner", cascade="all, delete-orphan"
+    )
 
 
 class Contact(Base):
@@ -40,6 +46,8 @@ class Contact(Base):
     # Metadata
     modified = Column(DateTime, nullable=True)
     created = Column(DateTime, nullable=True)
+    # Position in the change sequence, maintained by triggers (see app/sync.py)
+    change_seq = Column(Integer, nullable=True)
 
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="contacts")
@@ -55,21 +63,98 @@ class Contact(Base):
 
     address = Column(String, nullable=True)  # TODO: Address should be a separate table
 
+    # Photo in the blob store (app/blobs.py), from imported vCards
+    photo_sha256 = Column(String(64), nullable=True)
+    photo_type = Column(String, nullable=True)
+
+    # Identity and content hashes for re-imports (see app/normalize.py)
+    fingerprint = Column(Integer, nullable=True)
+    content_hash = Column(Integer, nullable=True)
+
     communications = relationship(
         "Communication", back_populates="contact", cascade="all, delete-orphan"
     )
 
 
+# Sort key for contact lists: last name, first name, id. NULL names sort like
+# empty strings so keyset pagination can compare them. The expressions must be
+# rendered identically in queries, otherwise SQLite ignores the index.
+contact_sort_key = (
+    func.coalesce(Contact.last_name, literal_column("''")),
+    func.coalesce(Contact.first_name, literal_column("''")),
+    Contact.id,
+)
+
+Index("ix_contacts_owner_sort", Contact.owner_id, *contact_sort_key)
+Index("ix_contacts_owner_fingerprint", Contact.owner_id, Contact.fingerprint)
+Index("ix_contacts_owner_change_seq", Contact.owner_id, Contact.change_seq)
+
+
 class Communication(Base):
     """Communication information"""
 
     __tablename__ = "communications"
 
     id = Column(Integer, primary_key=True, index=True)
-    contact_id = Column(Integer, ForeignKey("contacts.id"))
+    contact_id = Column(Integer, ForeignKey("contacts.id"), index=True)
 
     comm_type = Column(String, nullable=False)
     label = Column(String, nullable=True)
     value = Column(String, nullable=False)
+    # E.164 style phone number / case-folded e-mail for reverse lookups
+    normalized_value = Column(String, nullable=True)
 
     contact = relationship("Contact", back_populates="communications")
+
+    __table_args__ = (
+        Index("ix_communications_lookup", "comm_type", "normalized_value"),
+    )
+
+
+class ContactTombstone(Base):
+    """Left behind by a deleted contact so sync clients learn about it"""
+
+    __tablename__ = "contact_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_contact_tombstones_owner_change_seq", "owner_id", "change_seq"),
+    )
+
+
+class ImportJob(Base):
+    """Queued vCard import, processed in chunks by the import workers"""
+
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    filename = Column(String, nullable=True)
+    # Raw upload, archived in the blob store
+    file_sha256 = Column(String(64), nullable=False)
+
+    # queued -> running -> done | failed
+    state = Column(String, nullable=False, default="queued")
+    total = Column(Integer, nullable=True)  # Known once the file is parsed
+    processed = Column(Integer, nullable=False, default=0)
+    # Of the processed contacts: existing ones updated / left as they were
+    updated = Column(Integer, nullable=True)
+    unchanged = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    # The owner's contact version (sync.get_owner_version) right after the
+    # import. Still current -> uploading the same file again changes nothing.
+    owner_version = Column(Integer, nullable=True)
+
+    created = Column(DateTime, nullable=True)
+    started = Column(DateTime, nullable=True)
+    finished = Column(DateTime, nullable=True)
+
+    owner = relationship("User", back_populates="import_jobs")
+
+    __table_args__ = (Index("ix_import_jobs_state_owner", "state", "owner_id"),)
@@ -0,0 +1,129 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Change tracking for delta sync. Every insert and update of a contact moves
+# it to the next value of one global sequence, a delete leaves a tombstone
+# with its own value. Like the search index this is done by triggers, so
+# every write path (ORM, bulk import, cascades) is covered.
+# change_sequence.pruned is the highest sequence value of a removed
+# tombstone: sync tokens below it may have missed deletions.
+TOMBSTONE_RETENTION_DAYS = int(
+    os.environ.get("MINIDRIVE_TOMBSTONE_RETENTION_DAYS", "90")
+)
+
+_NEXT_SEQ = "(SELECT value FROM change_sequence WHERE id = 1)"
+_BUMP_SEQ = "UPDATE change_sequence SET value = value + 1 WHERE id = 1;"
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS change_sequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        value INTEGER NOT NULL,
+        pruned INTEGER NOT NULL DEFAULT 0
+    )""",
+    "INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)",
+    # Bulk inserts reserve their values up front (reserve_change_seqs)
+    f"""CREATE TRIGGER IF NOT EXISTS contacts_seq_ai AFTER INSERT ON contacts
+        WHEN new.change_seq IS NULL BEGIN
+        {_BUMP_SEQ}
+        UPDATE contacts SET change_seq = {_NEXT_SEQ} WHERE id = new.id;
+    END""",
+    # The trigger's own UPDATE changes change_seq and does not match again
+    f"""CREATE TRIGGER IF NOT EXISTS contacts_seq_au AFTER UPDATE ON contacts
+        WHEN new.change_seq IS old.change_seq BEGIN
+        {_BUMP_SEQ}
+        UPDATE contacts SET change_seq = {_NEXT_SEQ} WHERE id = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS contacts_seq_ad AFTER DELETE ON contacts BEGIN
+        {_BUMP_SEQ}
+        INSERT INTO contact_tombstones (contact_id, owner_id, change_seq, deleted)
+        VALUES (old.id, old.owner_id, {_NEXT_SEQ}, datetime('now'));
+    END""",
+]
+
+# Contacts from before change tracking get values behind the current ones
+_BACKFILL = [
+    f"""UPDATE contacts SET change_seq = {_NEXT_SEQ} + id
+        WHERE change_seq IS NULL""",
+    """UPDATE change_sequence
+        SET value = max(value, (SELECT coalesce(max(change_seq), 0) FROM contacts))
+        WHERE id = 1""",
+]
+
+
+def create_change_tracking(bind):
+    """Create the sequence table and triggers, numbering untracked rows."""
+    with bind.begin() as conn:
+        for statement in _DDL:
+            conn.execute(text(statement))
+        untracked = conn.execute(
+            text("SELECT 1 FROM contacts WHERE change_seq IS NULL LIMIT 1")
+        ).first()
+        if untracked:
+            for statement in _BACKFILL:
+                conn.execute(text(statement))
+
+
+def prune_tombstones(bind, retention_days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+    """Remove tombstones older than ``retention_days``."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    params = {"cutoff": cutoff.strftime("%Y-%m-%d %H:%M:%S")}
+    with bind.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE change_sequence SET pruned = max(pruned, coalesce(("
+                "SELECT max(change_seq) FROM contact_tombstones "
+                "WHERE deleted < :cutoff), 0)) WHERE id = 1"
+            ),
+            params,
+        )
+        result = conn.execute(
+            text("DELETE FROM contact_tombstones WHERE deleted < :cutoff"), params
+        )
+        return result.rowcount
+
+
+async def reserve_change_seqs(db: AsyncSession, count: int) -> int:
+    """Reserve ``count`` consecutive sequence values, returns the first.
+
+    Rows inserted with a change_seq are skipped by the insert trigger, which
+    saves bulk imports two statements per contact."""
+    result = await db.execute(
+        text(
+            "UPDATE change_sequence SET value = value + :count WHERE id = 1 "
+            "RETURNING value"
+        ),
+        {"count": count},
+    )
+    return result.scalar_one() - count + 1
+
+
+async def get_sequence_state(db: AsyncSession) -> Tuple[int, int]:
+    """Current and pruned sequence value."""
+    result = await db.execute(
+        text("SELECT value, pruned FROM change_sequence WHERE id = 1")
+    )
+    return tuple(result.one())
+
+
+async def get_owner_version(db: AsyncSession, user_id: int) -> int:
+    """Changes whenever one of the user's contacts is created, modified or
+    deleted: the highest sequence value of their contacts and tombstones.
+
+    Two index lookups. The pruned value is included so a version can not
+    go back to an earlier one when the newest tombstone is pruned."""
+    result = await db.execute(
+        text(
+            "SELECT max("
+            "coalesce((SELECT max(change_seq) FROM contacts "
+            "WHERE owner_id = :owner_id), 0), "
+            "coalesce((SELECT max(change_seq) FROM contact_tombstones "
+            "WHERE owner_id = :owner_id), 0), "
+            "pruned) FROM change_sequence WHERE id = 1"
+        ),
+        {"owner_id": user_id},
+    )
+    return result.scalar_one()
@@ -0,0 +1,88 @@
+"""Read throughput while a large import is running, per engine profile.
+
+python -m benchmarks.bench_db_profile --contacts 100000 --readers 4
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud
+from app.database import (
+    ENGINE_PROFILES,
+    Base,
+    create_async_sqlite_engine,
+    create_sqlite_engine,
+)
+from app.parser.vCardParser import parse_vcard_chunk
+from app.search import create_search_index
+from app.sql_schema import models
+from app.sync import create_change_tracking
+from benchmarks.bench_parser import make_vcf
+
+
+async def run(profile: str, rows, readers: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="minidrive-bench-"), "bench.db")
+    setup = create_sqlite_engine(f"sqlite:///{path}", profile=profile)
+    Base.metadata.create_all(bind=setup)
+    create_search_index(bind=setup)
+    create_change_tracking(bind=setup)
+    setup.dispose()
+
+    url = f"sqlite+aiosqlite:///{path}"
+    writer = create_async_sqlite_engine(url, profile=profile)
+    reader = create_async_sqlite_engine(url, profile=profile, read_only=True)
+    WriteSession = async_sessionmaker(bind=writer, expire_on_commit=False)
+    ReadSession = async_sessionmaker(bind=reader, expire_on_commit=False)
+
+    async with WriteSession() as db:
+        db.add(models.User(username="bench", hashed_password="-"))
+        await db.commit()
+        await crud.import_contact_rows(db, rows[:1000], 1, set())
+        await db.commit()
+
+    done = asyncio.Event()
+
+    async def read_loop():
+        count = 0
+        while not done.is_set():
+            async with ReadSession() as db:
+                await crud.get_contacts(db, user_id=1, limit=20)
+            count += 1
+        return count
+
+    tasks = [asyncio.create_task(read_loop()) for _ in range(readers)]
+    start = time.perf_counter()
+    async with WriteSession() as db:
+        # The first 1000 are there already, the rest is inserted
+        await crud.import_contact_rows(db, rows, 1, set())
+        await db.commit()
+    elapsed = time.perf_counter() - start
+    done.set()
+    reads = await asyncio.gather(*tasks)
+    await writer.dispose()
+    await reader.dispose()
+
+    print(
+        f"{profile:<11} import {elapsed:7.2f}s   "
+        f"reads during import {sum(reads) / elapsed:9.0f}/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=50000)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    rows = parse_vcard_chunk(make_vcf(args.contacts).encode())
+    for profile in ENGINE_PROFILES:
+        asyncio.run(run(profile, rows, args.readers))
+
+
+if __name__ == "__main__":
+    main()
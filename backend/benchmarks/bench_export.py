@@ -0,0 +1,122 @@
+"""Time to first byte and server memory of GET /contacts/export.vcf.
+
+Starts uvicorn against a throwaway database, fills it with contacts and
+streams the export once. Memory is read from /proc (Linux only):
+
+    python -m benchmarks.bench_export --contacts 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud
+from app.database import create_async_sqlite_engine
+from app.parser.vCardParser import parse_vcard_chunk
+from benchmarks.bench_parser import make_vcf
+
+CHUNK = 50000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+async def fill(path: str, contacts: int, user_id: int):
+    engine = create_async_sqlite_engine(f"sqlite+aiosqlite:///{path}")
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    # Like an import job: one transaction per chunk, namesakes across chunks
+    # are kept apart by the shared set of claimed ids
+    claimed = set()
+    for start in range(0, contacts, CHUNK):
+        vcf = make_vcf(min(CHUNK, contacts - start), seed=start)
+        async with Session() as db:
+            await crud.import_contact_rows(
+                db, parse_vcard_chunk(vcf.encode()), user_id, claimed
+            )
+            await db.commit()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="minidrive-bench-")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base, timeout=None) as client:
+            for _ in range(100):
+                try:
+                    client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            client.post("/register", json={"username": "bench", "password": "x"})
+            token = client.post(
+                "/token", data={"username": "bench", "password": "x"}
+            ).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            start = time.perf_counter()
+            asyncio.run(fill(os.path.join(workdir, "minidrive.db"), args.contacts, 1))
+            print(
+                f"filled      {args.contacts} contacts in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+
+            anon_before = peak = memory_kb(server.pid, "RssAnon")
+            size = 0
+            start = time.perf_counter()
+            ttfb = None
+            with client.stream("GET", "/contacts/export.vcf", headers=headers) as r:
+                for chunk in r.iter_bytes():
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start
+                    size += len(chunk)
+                    peak = max(peak, memory_kb(server.pid, "RssAnon"))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"ttfb        {ttfb * 1000:.1f}ms")
+    print(
+        f"export      {size / 1e6:.1f}MB in {elapsed:.1f}s "
+        f"({args.contacts / elapsed:.0f} contacts/s)"
+    )
+    print(
+        f"server rss  {anon_before / 1024:.0f}MB before, peak {peak / 1024:.0f}MB "
+        f"(+{(peak - anon_before) / 1024:.0f}MB during export, RssAnon)"
+    )
+
+
+if __name__ == "__main__":
+    main()
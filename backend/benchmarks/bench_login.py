@@ -0,0 +1,81 @@
+"""Login throughput and latency of unrelated endpoints during a login storm.
+
+Runs the app in-process against a throwaway database:
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 32
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    # The database URL is relative to the working directory
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="minidrive-bench-"))
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    client.post("/register", json={"username": "bench", "password": "secret"})
+    token = client.post(
+        "/token", data={"username": "bench", "password": "secret"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    statuses = []
+    done = threading.Event()
+    read_latencies = []
+
+    def login(_):
+        response = client.post(
+            "/token", data={"username": "bench", "password": "secret"}
+        )
+        statuses.append(response.status_code)
+
+    def reader():
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get("/contacts/?limit=10", headers=headers)
+            read_latencies.append(time.perf_counter() - start)
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader_thread.join()
+
+    ok = statuses.count(200)
+    print(f"logins      {ok} ok, {statuses.count(429)} rejected (429)")
+    print(f"throughput  {ok / elapsed:.1f} logins/s")
+    print(
+        f"GET /contacts/ during storm: n={len(read_latencies)} "
+        f"p50={percentile(read_latencies, 0.5):.1f}ms "
+        f"p99={percentile(read_latencies, 0.99):.1f}ms "
+        f"mean={statistics.mean(read_latencies) * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Parse throughput of the import pipeline per number of parser processes.
+
+Runs iter_parsed_chunks over a generated VCF (cached like the suite's
+datasets) in-process and with process pools of increasing size, and
+prints contacts/s and the speedup over in-process parsing. Pool start-up
+is reported separately. The speedup is bounded by the CPU count:
+
+    python -m benchmarks.bench_parallel_parse --contacts 200000 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from app.imports import IMPORT_CHUNK_SIZE, create_parse_pool, iter_parsed_chunks
+from benchmarks.suite import dataset_path
+
+
+async def parse_all(path: str, pool, workers: int, chunk_size: int) -> int:
+    count = 0
+    async for contacts in iter_parsed_chunks(
+        path, pool=pool, workers=workers, chunk_size=chunk_size
+    ):
+        count += len(contacts)
+    return count
+
+
+def measure(path: str, workers: int, chunk_size: int):
+    pool = None
+    startup = 0.0
+    if workers:
+        start = time.perf_counter()
+        pool = create_parse_pool(workers)
+        # Start every process before timing
+        list(pool.map(abs, range(workers * 4)))
+        startup = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        cpu = time.process_time()
+        count = asyncio.run(parse_all(path, pool, workers, chunk_size))
+        # CPU of this process only: with a pool this is the serial part
+        # (splitting, unpickling) that bounds the speedup
+        cpu = time.process_time() - cpu
+        return count, time.perf_counter() - start, startup, cpu
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    path = str(dataset_path(args.contacts))
+    print(
+        f"{args.contacts} contacts, {os.path.getsize(path) / 1e6:.1f}MB, "
+        f"chunks of {args.chunk_size}, {os.cpu_count()} CPUs"
+    )
+    count, baseline, _, cpu = measure(path, 0, args.chunk_size)
+    print(
+        f"  in-process   {count / baseline:9.0f} contacts/s"
+        f"{'':16}{cpu / count * 1e6:5.1f}us CPU/contact"
+    )
+    for workers in args.workers:
+        count, elapsed, startup, cpu = measure(path, workers, args.chunk_size)
+        print(
+            f"  {workers:2d} workers   {count / elapsed:9.0f} contacts/s  "
+            f"{baseline / elapsed:5.2f}x  pool start {startup * 1000:5.0f}ms  "
+            f"{cpu / count * 1e6:5.1f}us parent CPU/contact"
+        )
+
+
+if __name__ == "__main__":
+    main()
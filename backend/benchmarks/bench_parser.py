@@ -0,0 +1,64 @@
+"""Compare the native vCard parser against the old vobject based path.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_parser --contacts 50000
+"""
+
+import argparse
+import random
+import time
+
+from app.parser.vCardParser import _parse_vcards_vobject, parse_vcards
+
+FIRST_NAMES = ["Edwin", "Antonios", "Volkhard", "Apollonia", "Halil", "Jürgen"]
+LAST_NAMES = ["Rust", "Gutknecht", "Heintze", "Kusch", "Peukert", "Müller"]
+CITIES = ["Biedenkopf", "Grevenbroich", "Hünfeld", "Ahaus", "Lüneburg"]
+
+
+def make_vcf(n: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    cards = []
+    for i in range(n):
+        first = rnd.choice(FIRST_NAMES)
+        last = rnd.choice(LAST_NAMES)
+        cards.append(
+            "\n".join(
+                [
+                    "BEGIN:VCARD",
+                    "VERSION:3.0",
+                    f"N:{last};{first};;;",
+                    f"FN:{first} {last}",
+                    f"EMAIL;TYPE=INTERNET,HOME:{first.lower()}{i}@example.org",
+                    f"TEL;TYPE=CELL,VOICE:+49(0){rnd.randint(10**9, 10**10 - 1)}",
+                    f"ADR;TYPE=HOME:;;Allee {rnd.randint(1, 999)};"
+                    f"{rnd.choice(CITIES)};;{rnd.randint(10000, 99999)};Germany",
+                    "END:VCARD",
+                ]
+            )
+        )
+    return "\n".join(cards) + "\n"
+
+
+def measure(name: str, func, content: str) -> float:
+    start = time.perf_counter()
+    contacts = func(content)
+    elapsed = time.perf_counter() - start
+    rate = len(contacts) / elapsed
+    print(f"{name:<10} {len(contacts):>8} contacts {elapsed:8.3f}s {rate:12.0f}/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=20000)
+    args = parser.parse_args()
+
+    content = make_vcf(args.contacts)
+    native = measure("native", parse_vcards, content)
+    fallback = measure("vobject", _parse_vcards_vobject, content)
+    print(f"speedup    {native / fallback:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Re-uploading the same export: time per import and contacts afterwards.
+
+Imports a generated VCF through POST /files/, then uploads it again
+unchanged (answered from the file hash), again with different bytes but
+the same contacts (matched by fingerprint), and with every tenth contact
+changed. Before fingerprints every re-upload cost as much as the first
+import and added all contacts again. Runs in-process against a throwaway
+database:
+
+    python -m benchmarks.bench_reimport --contacts 100000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--contacts", type=int, default=100000)
+    args = parser.parse_args()
+
+    # The database URL is relative to the working directory
+    sys.path.insert(0, os.getcwd())
+    from benchmarks.suite import dataset_path
+
+    vcf = dataset_path(args.contacts).read_bytes()
+    os.chdir(tempfile.mkdtemp(prefix="minidrive-bench-"))
+
+    import httpx
+
+    from app.main import app
+
+    cards = vcf.split(b"END:VCARD")
+    changed = b"END:VCARD".join(
+        card.replace(b"\nTEL;", b"\nTEL;TYPE=WORK:+4930123\r\nTEL;", 1)
+        if i % 10 == 0
+        else card
+        for i, card in enumerate(cards)
+    )
+    uploads = {
+        "first import": vcf,
+        "same file": vcf,
+        "same contacts": vcf + b"\r\n",
+        "10% changed": changed,
+    }
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with (
+            app.router.lifespan_context(app),
+            httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=None
+            ) as client,
+        ):
+            await client.post(
+                "/register", json={"username": "bench", "password": "secret"}
+            )
+            token = (
+                await client.post(
+                    "/token", data={"username": "bench", "password": "secret"}
+                )
+            ).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            for name, data in uploads.items():
+                start = time.perf_counter()
+                job = (
+                    await client.post(
+                        "/files/",
+                        files={"file": ("bench.vcf", data, "text/vcard")},
+                        headers=headers,
+                    )
+                ).json()
+                while job["state"] not in ("done", "failed"):
+                    await asyncio.sleep(0.01)
+                    job = (
+                        await client.get(f"/imports/{job['id']}", headers=headers)
+                    ).json()
+                elapsed = time.perf_counter() - start
+                contacts = len(
+                    (
+                        await client.get(
+                            "/contacts/?limit=1000000&with_communications=false",
+                            headers=headers,
+                        )
+                    ).json()
+                )
+                inserted = job["processed"] - job["updated"] - job["unchanged"]
+                print(
+                    f"  {name:<15} {elapsed:7.2f}s  inserted {inserted:7d}  "
+                    f"updated {job['updated']:6d}  unchanged {job['unchanged']:7d}  "
+                    f"contacts {contacts:7d}"
+                )
+
+    print(f"{args.contacts} contacts, {len(vcf) / 1e6:.1f}MB")
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
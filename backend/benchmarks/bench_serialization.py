@@ -0,0 +1,131 @@
+"""CPU per list request: row dicts + orjson against ORM objects + response_model.
+
+GET /contacts/ is compared with a reference endpoint registered here that
+loads ORM objects and lets FastAPI validate and serialize them through
+the response model, the way the list endpoint worked before. Both run
+in-process against a throwaway database and must return the same JSON.
+The response cache is off, otherwise the repeated pages of GET /contacts/
+are cache hits; --response-cache measures with it:
+
+    python -m benchmarks.bench_serialization --contacts 20000 --limit 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="keep the response cache on (rows + orjson serves repeated pages from it)",
+    )
+    args = parser.parse_args()
+    # Read when app.response_cache is imported
+    if not args.response_cache:
+        os.environ["MINIDRIVE_RESPONSE_CACHE_MB"] = "0"
+
+    # The database URL is relative to the working directory
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="minidrive-bench-"))
+
+    import httpx
+    from fastapi import Depends
+
+    from app import crud
+    from app.database import AsyncSessionLocal, get_db
+    from app.main import app, get_current_user
+    from app.parser.vCardParser import parse_vcard_chunk
+    from app.pydantic_schema import schema
+    from app.sql_schema import models
+    from benchmarks.bench_parser import make_vcf
+
+    @app.get("/bench/contacts-orm", response_model=List[schema.ContactResponse])
+    async def read_contacts_orm(
+        skip: int = 0,
+        limit: int = 100,
+        db=Depends(get_db),
+        current_user=Depends(get_current_user),
+    ):
+        result = await db.execute(
+            crud._contact_select()
+            .where(models.Contact.owner_id == current_user.id)
+            .order_by(*models.contact_sort_key)
+            .offset(skip)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with (
+            app.router.lifespan_context(app),
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client,
+        ):
+            await client.post(
+                "/register", json={"username": "bench", "password": "secret"}
+            )
+            token = (
+                await client.post(
+                    "/token", data={"username": "bench", "password": "secret"}
+                )
+            ).json()["access_token"]
+            # Compression is the same for both paths, leave it out
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Accept-Encoding": "identity",
+            }
+
+            rows = parse_vcard_chunk(make_vcf(args.contacts, seed=1).encode())
+            async with AsyncSessionLocal() as db:
+                await crud.import_contact_rows(db, rows, 1, set())
+                await db.commit()
+
+            paths = {
+                "orm + response_model": "/bench/contacts-orm",
+                "rows + orjson": "/contacts/",
+            }
+            pages = max(1, args.contacts // args.limit)
+            bodies = {}
+            cpu = {}
+            for name, path in paths.items():
+                bodies[name] = (
+                    await client.get(f"{path}?limit={args.limit}", headers=headers)
+                ).content
+                start = time.process_time()
+                for i in range(args.requests):
+                    skip = (i % pages) * args.limit
+                    response = await client.get(
+                        f"{path}?skip={skip}&limit={args.limit}", headers=headers
+                    )
+                    response.raise_for_status()
+                cpu[name] = (time.process_time() - start) / args.requests
+            return bodies, cpu
+
+    bodies, cpu = asyncio.run(run())
+
+    reference, fast = bodies.values()
+    if json.loads(reference) != json.loads(fast):
+        raise SystemExit("responses differ")
+    print(
+        f"{args.limit} contacts per request, "
+        f"{len(fast) / 1024:.0f}KB, identical JSON: {reference == fast}"
+    )
+    for name, seconds in cpu.items():
+        print(f"  {name:<22} {seconds * 1000:7.1f}ms CPU per request")
+    baseline, optimized = cpu.values()
+    print(f"  speedup                {baseline / optimized:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Aggregate import throughput with concurrent tenants, with and without
+sharding.
+
+Every tenant inserts the same contacts chunk by chunk, the way import jobs
+do, all tenants at the same time. Each run is a fresh process and database
+directory per storage mode and tenant count:
+
+    python -m benchmarks.bench_sharding --contacts 20000 --tenants 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CHUNK = 5000
+
+
+async def run_tenants(contacts: int, tenants: int) -> float:
+    from app.database import AsyncSessionLocal
+    from app.main import crud, models
+    from app.parser.vCardParser import parse_vcard_chunk
+    from app.shards import shard_router, use_shard
+    from benchmarks.suite import dataset_path
+
+    rows = parse_vcard_chunk(dataset_path(contacts).read_bytes())
+
+    async with AsyncSessionLocal() as db:
+        users = [
+            models.User(username=f"tenant{i}", hashed_password="-")
+            for i in range(tenants)
+        ]
+        db.add_all(users)
+        await db.commit()
+        user_ids = [user.id for user in users]
+
+    async def tenant(user_id: int):
+        for start in range(0, len(rows), CHUNK):
+            async with AsyncSessionLocal() as db:
+                await use_shard(db, user_id)
+                await crud.insert_contact_rows(db, rows[start : start + CHUNK], user_id)
+                await db.commit()
+
+    # Open the shards before timing
+    for user_id in user_ids:
+        await shard_router.engines(user_id)
+    start = time.perf_counter()
+    await asyncio.gather(*(tenant(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    await shard_router.dispose()
+    return len(rows) * tenants / elapsed
+
+
+def child(args):
+    throughput = asyncio.run(run_tenants(args.contacts, args.child))
+    print(json.dumps({"contacts_per_second": throughput}))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--contacts", type=int, default=20000, help="per tenant")
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["off", "user"])
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    backend_dir = os.getcwd()
+    print(f"{args.contacts} contacts per tenant, {os.cpu_count()} CPUs")
+    for mode in args.modes:
+        baseline = None
+        for tenants in args.tenants:
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_sharding",
+                    "--contacts",
+                    str(args.contacts),
+                    "--child",
+                    str(tenants),
+                ],
+                # The database URL is relative to the working directory
+                cwd=tempfile.mkdtemp(prefix="minidrive-bench-"),
+                env={
+                    **os.environ,
+                    "PYTHONPATH": backend_dir,
+                    "MINIDRIVE_SHARDING": "" if mode == "off" else mode,
+                },
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            throughput = json.loads(result.stdout.strip().splitlines()[-1])[
+                "contacts_per_second"
+            ]
+            baseline = baseline or throughput
+            print(
+                f"  sharding={mode:<5} {tenants:2d} tenants  "
+                f"{throughput:9.0f} contacts/s  {throughput / baseline:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
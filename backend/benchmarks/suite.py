@@ -0,0 +1,290 @@
+"""Benchmark suite: parse, import, read latencies and a mixed workload.
+
+Generates a deterministic dataset with utils/generate_fake_contacts.py
+(cached in benchmarks/.cache), seeds a fresh database in a temporary
+directory and runs the app in-process. Run from the backend directory:
+
+    python -m benchmarks.suite --contacts 100000 --output results.json
+    python -m benchmarks.suite --contacts 100000 --compare results.json
+
+Results are written as JSON; --compare prints the change of every metric
+against an earlier run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+CACHE_DIR = BACKEND_DIR / "benchmarks" / ".cache"
+
+# The generator lives in utils/ at the repository root
+sys.path.insert(0, str(BACKEND_DIR.parent / "utils"))
+
+from generate_fake_contacts import fake_vcards  # noqa: E402
+
+from app.parser.vCardParser import parse_vcards  # noqa: E402
+
+# Metrics where a larger value is better, for --compare
+HIGHER_IS_BETTER = ("per_second", "throughput")
+
+
+def dataset_path(
+    contacts: int, seed: int = 1, phones: int = 1, emails: int = 1
+) -> Path:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f"contacts-{contacts}-s{seed}-p{phones}-e{emails}.vcf"
+    if not path.exists():
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for vcard in fake_vcards(contacts, seed, phones, emails):
+                f.write(vcard)
+        tmp.rename(path)
+    return path
+
+
+def dataset(contacts: int, seed: int, phones: int, emails: int) -> str:
+    return dataset_path(contacts, seed, phones, emails).read_text(encoding="utf-8")
+
+
+def latencies(values) -> dict:
+    values = sorted(values)
+
+    def pct(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+    return {
+        "n": len(values),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.mean(values) * 1000, 2),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    response = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.url}: {response.status_code}")
+    return elapsed, response
+
+
+def run(args) -> dict:
+    results = {}
+
+    vcf = dataset(args.contacts, args.seed, args.phones, args.emails)
+
+    start = time.perf_counter()
+    parsed = parse_vcards(vcf)
+    elapsed = time.perf_counter() - start
+    results["parse"] = {
+        "seconds": round(elapsed, 3),
+        "contacts_per_second": round(len(parsed) / elapsed),
+    }
+    last_names = sorted({c.last_name for c in parsed if c.last_name})
+    del parsed
+
+    # The database URL is relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="minidrive-bench-"))
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    rnd = random.Random(args.seed)
+    with TestClient(app) as client:
+        client.post("/register", json={"username": "bench", "password": "secret"})
+        token = client.post(
+            "/token", data={"username": "bench", "password": "secret"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        start = time.perf_counter()
+        _, response = timed(
+            client.post,
+            "/files/",
+            files={"file": ("bench.vcf", vcf.encode("utf-8"), "text/vcard")},
+            headers=headers,
+        )
+        job_id = response.json()["id"]
+        while True:
+            job = client.get(f"/imports/{job_id}", headers=headers).json()
+            if job["state"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        if job["state"] != "done":
+            raise RuntimeError(f"Import failed: {job['error']}")
+        results["import"] = {
+            "seconds": round(elapsed, 3),
+            "contacts_per_second": round(job["processed"] / elapsed),
+        }
+        del vcf
+
+        def list_page():
+            skip = rnd.randrange(max(1, args.contacts - 50))
+            return timed(
+                client.get, f"/contacts/?skip={skip}&limit=50", headers=headers
+            )[0]
+
+        def list_cursor():
+            return timed(client.get, "/contacts/?cursor=&limit=50", headers=headers)[0]
+
+        def detail():
+            contact_id = rnd.randint(1, args.contacts)
+            return timed(client.get, f"/contacts/{contact_id}", headers=headers)[0]
+
+        def search():
+            q = rnd.choice(last_names)[: rnd.randint(3, 6)]
+            return timed(
+                client.get, "/contacts/search", params={"q": q}, headers=headers
+            )[0]
+
+        def update():
+            contact_id = rnd.randint(1, args.contacts)
+            return timed(
+                client.put,
+                f"/contacts/{contact_id}",
+                # communications=None keeps the existing ones
+                json={"notes": f"bench {rnd.random()}", "communications": None},
+                headers=headers,
+            )[0]
+
+        operations = {
+            "list": list_page,
+            "list_cursor": list_cursor,
+            "detail": detail,
+            "search": search,
+        }
+        results["latency"] = {
+            name: latencies([fn() for _ in range(args.requests)])
+            for name, fn in operations.items()
+        }
+
+        # Mixed workload: mostly reads, some writes, from concurrent clients
+        mix = [detail] * 5 + [list_page] * 2 + [search] * 2 + [update]
+        samples = {}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.duration
+
+        def worker(_):
+            while time.perf_counter() < deadline:
+                fn = rnd.choice(mix)
+                elapsed = fn()
+                with lock:
+                    samples.setdefault(fn.__name__, []).append(elapsed)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(worker, range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        total = sum(len(v) for v in samples.values())
+        results["mixed"] = {
+            "concurrency": args.concurrency,
+            "requests_per_second": round(total / elapsed, 1),
+            **{name: latencies(values) for name, values in samples.items()},
+        }
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict):
+    old = flatten(baseline["results"])
+    new = flatten(current["results"])
+    print(f"\nchanges against {baseline['commit']} ({baseline['timestamp']}):")
+    for name in sorted(old.keys() & new.keys()):
+        if name.endswith((".n", "concurrency")) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name] * 100
+        better = change > 0 if name.endswith(HIGHER_IS_BETTER) else change < 0
+        marker = "" if abs(change) < 10 else ("  better" if better else "  WORSE")
+        print(
+            f"  {name:<40} {old[name]:>12} -> {new[name]:>12} {change:+7.1f}%{marker}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--phones", type=int, default=1, help="per contact")
+    parser.add_argument("--emails", type=int, default=1, help="per contact")
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "contacts": args.contacts,
+            "seed": args.seed,
+            "phones": args.phones,
+            "emails": args.emails,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+        },
+    }
+    report["results"] = run(args)
+
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if baseline:
+        compare(baseline, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+VCARD = b"""BEGIN:VCARD
+VERSION:3.0
+N:Lovelace;Ada;;;
+FN:Ada Lovelace
+ORG:Analytical Engines
+TEL;TYPE=CELL:+49 151 12345678
+EMAIL:ada@example.org
+END:VCARD
+"""
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # The database, blobs and shards are relative to the working directory
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("minidrive"))
+        from app.main import app
+
+        with TestClient(app) as client:
+            client.post("/register", json={"username": "ada", "password": "secret"})
+            token = client.post(
+                "/token", data={"username": "ada", "password": "secret"}
+            ).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+            yield client
+
+
+def import_vcard(client: TestClient, content: bytes) -> dict:
+    response = client.post("/files/", files={"file": ("ada.vcf", content)})
+    assert response.status_code == 202, response.text
+    job = response.json()
+    deadline = time.monotonic() + 10
+    while job["state"] not in ("done", "failed"):
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+        job = client.get(f"/imports/{job['id']}").json()
+    assert job["state"] == "done", job
+    return job
+
+
+def test_reimport_after_edit_restores_the_contact(client):
+    import_vcard(client, VCARD)
+    (contact,) = client.get("/contacts/").json()
+
+    edited = client.put(
+        f"/contacts/{contact['id']}",
+        json={"notes": "Edited by hand", "communications": None},
+    )
+    assert edited.status_code == 200, edited.text
+
+    # The edit changed the contact's content_hash: the vCard matches the
+    # contact by its name, differs from it and overwrites it
+    job = import_vcard(client, VCARD)
+    assert (job["updated"], job["unchanged"]) == (1, 0)
+    (restored,) = client.get("/contacts/").json()
+    assert restored["id"] == contact["id"]
+    assert restored["notes"] == contact["notes"]
+    assert restored["communications"] == contact["communications"]
+
+    # Unchanged since the last import
+    job = import_vcard(client, VCARD)
+    assert (job["updated"], job["unchanged"]) == (0, 1)
@@ -0,0 +1,62 @@
+import api from './api';
+
+const RECONNECT_DELAY_MS = 5000;
+
+// Change feed of the backend (GET /contacts/events, server-sent events).
+// EventSource cannot send the Authorization header, so the stream is read
+// with fetch. Calls onChange with every event, reconnects after errors and
+// returns a function that closes the stream.
+export function subscribeToContactChanges(onChange) {
+    const controller = new AbortController();
+    let reconnectTimer = null;
+
+    const connect = async () => {
+        try {
+            const token = localStorage.getItem('token');
+            const response = await fetch(`${api.defaults.baseURL}/contacts/events`, {
+                headers: token ? { Authorization: `Bearer ${token}` } : {},
+                signal: controller.signal,
+            });
+            if (response.status === 401) {
+                return; // Abgelaufener Token: die normalen Requests leiten zum Login
+            }
+            if (!response.ok) {
+                throw new Error(`Event stream failed with ${response.status}`);
+            }
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                // Events are separated by an empty line
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    const data = block
+                        .split('\n')
+                        .filter(line => line.startsWith('data:'))
+                        .map(line => line.slice(5).trim())
+                        .join('\n');
+                    if (data) {
+                        onChange(JSON.parse(data));
+                    }
+                }
+            }
+        } catch (error) {
+            if (controller.signal.aborted) return;
+            console.warn('Contact change feed interrupted', error);
+        }
+        if (!controller.signal.aborted) {
+            reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        }
+    };
+
+    connect();
+    return () => {
+        clearTimeout(reconnectTimer);
+        controller.abort();
+    };
+}
@@ -1,37 +1,74 @@
+import argparse
+from typing import Iterator, Optional
+
 from faker import Faker
 
 
-def generate_vcf(n, filename="contacts.vcf"):
+def fake_vcards(
+    n: int, seed: Optional[int] = None, phones: int = 1, emails: int = 1
+) -> Iterator[str]:
+    """Yield ``n`` vCards. With a seed the output is the same on every run."""
     fake = Faker("de_DE")
+    if seed is not None:
+        fake.seed_instance(seed)
+
+    for _ in range(n):
+        first_name = fake.first_name()
+        last_name = fake.last_name()
+        street = fake.street_name()
+        number = fake.building_number()
+        city = fake.city()
+        zip_code = fake.postcode()
+
+        # Demo: https://de.wikipedia.org/wiki/VCard#vCard_3.0
+        # Using vCard 3.0 Format
+        # Apple Contacts App uses vCard 3.0 Format as well as Google Contacts App.
+
+        vcard = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            f"N:{last_name};{first_name};;;",
+            f"FN:{first_name} {last_name}",
+        ]
+        for i in range(emails):
+            kind = "HOME" if i == 0 else "WORK"
+            vcard.append(f"EMAIL;TYPE=INTERNET,{kind}:{fake.email()}")
+        for i in range(phones):
+            kind = "CELL,VOICE" if i == 0 else "WORK,VOICE"
+            vcard.append(f"TEL;TYPE={kind}:{fake.phone_number()}")
+        vcard += [
+            f"ADR;TYPE=HOME:;;{street} {number};{city};;{zip_code};Germany",
+            "END:VCARD",
+            "",
+        ]
+        yield "\n".join(vcard)
+
 
+def generate_vcf(
+    n,
+    filename="contacts.vcf",
+    seed: Optional[int] = None,
+    phones: int = 1,
+    emails: int = 1,
+):
     with open(filename, "w", encoding="utf-8") as f:
-        for _ in range(n):
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            phone = fake.phone_number()
-            email = fake.email()
-            street = fake.street_name()
-            number = fake.building_number()
-            city = fake.city()
-            zip_code = fake.postcode()
-
-            # Demo: https://de.wikipedia.org/wiki/VCard#vCard_3.0
-            # Using vCard 3.0 Format
-            # Apple Contacts App uses vCard 3.0 Format as well as Google Contacts App.
-
-            vcard = [
-                "BEGIN:VCARD",
-                "VERSION:3.0",
-                f"N:{last_name};{first_name};;;",
-                f"FN:{first_name} {last_name}",
-                f"EMAIL;TYPE=INTERNET,HOME:{email}",
-                f"TEL;TYPE=CELL,VOICE:{phone}",
-                f"ADR;TYPE=HOME:;;{street} {number};{city};;{zip_code};Germany",
-                "END:VCARD",
-                "",
-            ]
-            f.write("\n".join(vcard))
+        for vcard in fake_vcards(n, seed=seed, phones=phones, emails=emails):
+            f.write(vcard)
     print(f"Erfolgreich {n} Kontakte in {filename} erstellt.")
 
 
-generate_vcf(5)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake vCard 3.0 contacts")
+    parser.add_argument("-n", "--contacts", type=int, default=5)
+    parser.add_argument("-o", "--output", default="contacts.vcf")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--phones", type=int, default=1)
+    parser.add_argument("--emails", type=int, default=1)
+    args = parser.parse_args()
+    generate_vcf(
+        args.contacts,
+        args.output,
+        seed=args.seed,
+        phones=args.phones,
+        emails=args.emails,
+    )